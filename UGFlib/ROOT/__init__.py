@@ -1,9 +1,11 @@
 #import ROOT as root
 import contextlib
+import importlib
 import sys
 class _root:
+	# imports ROOT on first attribute access
 	def __getattr__(self, name):
-		return sys.modules['ROOT'].__getattr__(name)
+		return getattr(importlib.import_module('ROOT'), name)
 root = _root()
 
 class Arrow:
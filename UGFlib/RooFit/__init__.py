@@ -1,5 +1,12 @@
 from .pdf import AutoNaming, VarDummy, Var, VarTuple, AllPdf, ExtendedPdf, Add, AddPdfItem
-from .pdf import Pdf, Gaus, Argus, Crys, Poly, Hist, Conv, Simu, SimuItem, BW, Keys, DblGaus
-from .pdf import VarList, VarFormula, DataHist, DataSet, VarSet
-from .helper import Color, drange, decimal_range, likelihood, significance, FitArgs, _Likelihood, FOM, getPull, drawPullLine, getResidue
-from .function import Crystal_ball
+from .pdf import Pdf, Gaus, Argus, Crys, Poly, Hist, Conv, Simu, SimuItem, BW, Keys, FastKeys, DblGaus
+from .pdf import VarList, VarFormula, formula, DataHist, DataSet, VarSet
+from .helper import Color, drange, decimal_range, likelihood, likelihood_adaptive, significance, significance_batch, SignificanceResult, FitArgs, FitDataPolicy, FitCache, FitSummary, _Likelihood, FOM, FOM_Threshold, getPull, getPulls, drawPullLine, getResidue, getResidues
+from .batch import Node, Shape, Sum
+from .native import NativeFit, NativeResult
+from .cache import DiskCache, cached, fingerprint, file_identity
+from .toy import ToyStudy
+from .scope import ModelScope
+from .modelcache import ModelCache, describe
+from .spec import SpecBuilder, build_model
+from .function import Crystal_ball, gaussian, double_gaussian, crystal_ball, breit_wigner, argus, chebyshev
@@ -0,0 +1,134 @@
+import math
+from collections import OrderedDict
+import numpy as np
+
+# Pure-NumPy evaluation graphs compiled from Pdf trees with Pdf.compile(). A node is called
+# on an array of observable values and returns densities normalized on the observable range.
+# Parameter values are read from the Vars bound at compile time, or taken from `values`, a
+# dict name -> float or name -> array of shape (B,) for a batch of parameter points, in
+# which case the result has shape (B,) + x.shape. Compiled graphs pickle without their
+# bindings, so they can be evaluated without ROOT given explicit values.
+
+def _simpson(y, dx):
+	return (y[..., 0] + 4 * y[..., 1:-1:2].sum(axis=-1) + 2 * y[..., 2:-1:2].sum(axis=-1) + y[..., -1]) * dx / 3
+
+def _expand(a, x):
+	a = np.asarray(a, dtype=float)
+	return a.reshape(a.shape + (1,) * np.ndim(x))
+
+class Node(object):
+	def __init__(self, bindings, observable, lo, hi):
+		for name, var in bindings.items():
+			# a formula (e.g. a yield or width computed from other Vars) would be fitted as a free parameter
+			if var is not None and not var.InheritsFrom('RooRealVar'):
+				raise NotImplementedError('no NumPy backend for parameter {0}, a {1} rather than a RooRealVar'.format(name, var.ClassName()))
+		self.bindings = bindings
+		self.observable = observable
+		self.lo = lo
+		self.hi = hi
+	@property
+	def params(self):
+		return list(self.bindings)
+	def values(self):
+		if None in self.bindings.values():
+			raise ValueError('graph has no bound Vars, pass values explicitly')
+		return {name: var.getVal() for name, var in self.bindings.items()}
+	def __call__(self, x, values=None):
+		return self.density(np.asarray(x, dtype=float), self.values() if values is None else values)
+	def expected(self, values=None):
+		return None
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['bindings'] = dict.fromkeys(self.bindings)
+		return state
+
+class Shape(Node):
+	grid = 4097
+	def __init__(self, fn, params, X, range=False, normalized=False):
+		super(Shape, self).__init__({p.GetName(): p for p in params}, X.GetName(), X.getMin(), X.getMax())
+		self.fn = fn
+		self.names = [p.GetName() for p in params]
+		self.extra = (self.lo, self.hi) if range else ()
+		self.normalized = normalized
+	def density(self, x, values):
+		if self.names:
+			p = np.stack(np.broadcast_arrays(*[np.asarray(values[n], dtype=float) for n in self.names]), axis=-1)
+		else:
+			p = np.empty(0)
+		f = self.fn(x, p, *self.extra)
+		if self.normalized:
+			return f
+		grid = np.linspace(self.lo, self.hi, self.grid)
+		return f / _expand(_simpson(self.fn(grid, p, *self.extra), grid[1] - grid[0]), x)
+
+class Sum(Node):
+	# extended: one yield per child; otherwise fractions for all but the last child
+	def __init__(self, children, coefs, extended=True):
+		bindings = {c.GetName(): c for c in coefs}
+		for child in children:
+			bindings.update(child.bindings)
+		super(Sum, self).__init__(bindings, children[0].observable, children[0].lo, children[0].hi)
+		self.children = children
+		self.coefs = [c.GetName() for c in coefs]
+		self.extended = extended
+	def density(self, x, values):
+		coefs = [_expand(values[c], x) for c in self.coefs]
+		if self.extended:
+			total = sum(coefs)
+			coefs = [c / total for c in coefs]
+		else:
+			coefs.append(1 - sum(coefs))
+		return sum(c * child.density(x, values) for c, child in zip(coefs, self.children))
+	def expected(self, values=None):
+		if not self.extended:
+			return None
+		values = self.values() if values is None else values
+		return sum(np.asarray(values[c], dtype=float) for c in self.coefs)
+
+# rfft of resolution kernels, keyed by the resolution pdf, its parameter values and the grid;
+# shared by every Conv with the same resolution, and stale entries simply stop being hit
+_kernel_cache = OrderedDict()
+_kernel_cache_size = 64
+def _kernel(res, key, values, n, dx):
+	vals = [np.asarray(values[name], dtype=float) for name in res.names]
+	cache_key = None
+	if all(v.ndim == 0 for v in vals):
+		cache_key = key, tuple(float(v) for v in vals), n, dx
+		if cache_key in _kernel_cache:
+			_kernel_cache.move_to_end(cache_key)
+			return _kernel_cache[cache_key]
+	p = np.stack(np.broadcast_arrays(*vals), axis=-1) if vals else np.empty(0)
+	# offsets 0, dx, ..., then negative ones, as the cyclic convolution wants them
+	k = res.fn(dx * np.fft.fftfreq(n, 1. / n), p, *res.extra)
+	ret = np.fft.rfft(k / (k.sum(axis=-1, keepdims=True) * dx), axis=-1)
+	if cache_key is not None:
+		_kernel_cache[cache_key] = ret
+		while len(_kernel_cache) > _kernel_cache_size:
+			_kernel_cache.popitem(False)
+	return ret
+
+class Conv(Node):
+	# physics (x) resolution by FFT on `bins` bins of the observable range, padded on both
+	# sides by `buffer` of the range as RooFFTConvPdf does; `key` names the resolution pdf
+	def __init__(self, physics, resolution, key, bins=1024, buffer=0.1):
+		if not isinstance(resolution, Shape):
+			raise NotImplementedError('resolution of a Conv must be a simple shape')
+		bindings = dict(physics.bindings)
+		bindings.update(resolution.bindings)
+		super(Conv, self).__init__(bindings, physics.observable, physics.lo, physics.hi)
+		self.physics = physics
+		self.resolution = resolution
+		self.key = key
+		self.dx = (self.hi - self.lo) / bins
+		pad = int(math.ceil(bins * buffer))
+		self.grid = self.lo + self.dx * (np.arange(bins + 2 * pad) - pad + 0.5)
+		self.inside = (self.grid > self.lo) & (self.grid < self.hi)
+	def density(self, x, values):
+		n = len(self.grid)
+		f = self.physics.density(self.grid, values) * self.inside
+		c = np.fft.irfft(np.fft.rfft(f, axis=-1) * _kernel(self.resolution, self.key, values, n, self.dx), n, axis=-1)
+		c = c / (c[..., self.inside].sum(axis=-1, keepdims=True) * self.dx)
+		u = np.clip((x - self.grid[0]) / self.dx, 0, n - 1 - 1e-9)
+		i = u.astype(int)
+		w = u - i
+		return c[..., i] * (1 - w) + c[..., i + 1] * w
@@ -0,0 +1,108 @@
+import subprocess
+import sys
+import time
+from ..ROOT import root
+
+# Timing helpers for the performance work in this package; `python -m UGFlib.RooFit.bench`
+# runs them on small generated models and prints the results; `... bench import [limit]`
+# checks that importing the package stays fast and does not load ROOT, and `... bench simu
+# [ncpu]` shows how Simu fits scale with the number of categories.
+
+def _best(fn, repeat):
+	best, ret = float('inf'), None
+	for i in range(repeat):
+		t = time.perf_counter()
+		ret = fn()
+		best = min(best, time.perf_counter() - t)
+	return best, ret
+
+def bench_fit(model, data, repeat=5, args=None):
+	# best wall time and minNll of fitTo through RooFit and through the native engine,
+	# both started from the parameter values the model has now
+	from .helper import FitArgs
+	args = FitArgs(0) if args is None else args
+	graph = model.compile()
+	start = graph.values()
+	def run(fit_args):
+		def _():
+			for name, var in graph.bindings.items():
+				var.setVal(start[name])
+			return model.fitTo(data, *fit_args).minNll()
+		return _
+	ret = {}
+	for key, fit_args in (('RooFit', tuple(args) + (root.RooFit.PrintLevel(-1),)), ('native', FitArgs(1))):
+		ret[key] = _best(run(fit_args), repeat)
+	return ret
+
+def _demo_fit(nevents=10000):
+	from .pdf import Var, Gaus, Poly, Add
+	X = Var('bench_x', 1., 0., 2.)
+	model = Add(Var('bench_nsig', nevents * 0.2, 0., 10. * nevents) * Gaus(X, Var('bench_mean', 1., 0.5, 1.5), Var('bench_sigma', 0.1, 0.01, 0.5)) + Var('bench_nbkg', nevents * 0.8, 0., 10. * nevents) * Poly(X, Var('bench_c1', 0., -1., 1.)))
+	data = model.generate(root.RooArgSet(X.var), nevents)
+	return model, data
+
+def _demo_simu(ncat, nevents=2000):
+	# ncat categories of gaussian signal on a linear background sharing mean and width
+	from .pdf import Var, Gaus, Poly, Add, Simu
+	X = Var('bench_simu_x', 1., 0., 2.)
+	mean, sigma = Var('bench_simu_mean', 1., 0.5, 1.5), Var('bench_simu_sigma', 0.1, 0.01, 0.5)
+	mapping = {}
+	for i in range(ncat):
+		pdf = Add(Var('bench_simu_nsig{0}_{1}'.format(ncat, i), nevents * 0.2, 0., 10. * nevents) * Gaus(X, mean, sigma) + Var('bench_simu_nbkg{0}_{1}'.format(ncat, i), nevents * 0.8, 0., 10. * nevents) * Poly(X, Var('bench_simu_c{0}_{1}'.format(ncat, i), 0., -1., 1.)))
+		mapping['cat{0}'.format(i)] = pdf, pdf.generate(root.RooArgSet(X.var), nevents)
+	return Simu.from_mapping(X, mapping)
+
+def bench_simu(ncats=(2, 5, 10, 20, 30), nevents=2000, ncpu=4, repeat=3):
+	# best fit wall time of a Simu per number of categories, serial and with the NLL of the
+	# categories split over ncpu processes
+	from .helper import FitArgs
+	from .pdf import Simu
+	ret = {}
+	for ncat in ncats:
+		model, data = _demo_simu(ncat, nevents)
+		params = model.getParameters(data)
+		start = params.snapshot()
+		def run(args):
+			def _():
+				params.assignValueOnly(start)
+				return model.fitTo(data, *args).minNll()
+			return _
+		base = tuple(FitArgs(0)[:2]) + (root.RooFit.PrintLevel(-1),)
+		ret[ncat] = _best(run(base), repeat)[0], _best(run(base + Simu.parallelArgs(ncpu)), repeat)[0]
+	return ret
+
+def bench_import(module='UGFlib.RooFit', repeat=3):
+	# best time to import `module` in a fresh interpreter, and whether that loaded ROOT
+	code = 'import sys, time; t = time.perf_counter(); import {0}; print(time.perf_counter() - t, "ROOT" in sys.modules)'.format(module)
+	best, loaded = float('inf'), None
+	for i in range(repeat):
+		out = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True).split()
+		best, loaded = min(best, float(out[0])), out[1] == 'True'
+	return best, loaded
+
+def check_import(limit=1., module='UGFlib.RooFit'):
+	# guard for the lazy ROOT import: fails if importing loads ROOT or takes longer than limit seconds
+	t, loaded = bench_import(module)
+	if loaded:
+		raise RuntimeError('importing {0} loads ROOT'.format(module))
+	if t > limit:
+		raise RuntimeError('importing {0} took {1:.3f} s, limit {2} s'.format(module, t, limit))
+	return t
+
+def main(argv=None):
+	argv = sys.argv[1:] if argv is None else argv
+	if argv[:1] == ['import']:
+		print('import {0:10.4f} s'.format(check_import(*map(float, argv[1:2]))))
+		return
+	if argv[:1] == ['simu']:
+		ncpu = int(argv[1]) if len(argv) > 1 else 4
+		for ncat, (serial, parallel) in bench_simu(ncpu=ncpu).items():
+			print('{0:3d} categories  serial {1:10.4f} s  NumCPU({2}) {3:10.4f} s'.format(ncat, serial, ncpu, parallel))
+		return
+	nevents = int(argv[0]) if argv else 10000
+	model, data = _demo_fit(nevents)
+	for key, (t, nll) in bench_fit(model, data).items():
+		print('{0:8s} {1:10.4f} s  minNll = {2}'.format(key, t, nll))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,138 @@
+import decimal
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+import weakref
+import numpy as np
+
+# Content-addressed on-disk cache. Keys are sha256 digests of everything a value depends on
+# (input file identities, the source code that computed it, its arguments); values are
+# pickled into <path>/<key[:2]>/<key>, and the least recently used entries are evicted once
+# the directory grows past max_size bytes.
+
+def file_identity(path):
+	st = os.stat(path)
+	return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+def _feed(h, obj):
+	if isinstance(obj, (list, tuple)):
+		h.update(b'(')
+		for x in obj:
+			_feed(h, x)
+		h.update(b')')
+	elif isinstance(obj, dict):
+		_feed(h, sorted(obj.items(), key=lambda kv: repr(kv[0])))
+	elif isinstance(obj, np.ndarray):
+		h.update(repr((obj.dtype.str, obj.shape)).encode())
+		h.update(np.ascontiguousarray(obj).tobytes())
+	elif isinstance(obj, (np.integer, np.floating, np.bool_)):
+		_feed(h, obj.item())
+		return
+	elif isinstance(obj, bytes):
+		h.update(obj)
+	elif obj is None or isinstance(obj, (str, bool, int, float, decimal.Decimal)):
+		h.update(repr((type(obj).__name__, obj)).encode())
+	else:
+		raise TypeError('cannot fingerprint {0!r}'.format(obj))
+	h.update(b',')
+
+def fingerprint(*parts):
+	h = hashlib.sha256()
+	_feed(h, parts)
+	return h.hexdigest()
+
+def source_hash(func):
+	func = getattr(func, '__wrapped__', func)
+	try:
+		return fingerprint(inspect.getsource(func))
+	except (OSError, TypeError):
+		return fingerprint(getattr(func, '__qualname__', repr(func)))
+
+class DiskCache(object):
+	_missing = object()
+	def __init__(self, path='.ugf_cache', max_size=2 * 1024 ** 3):
+		self.path = path
+		self.max_size = max_size
+	def _file(self, key):
+		return os.path.join(self.path, key[:2], key)
+	def __contains__(self, key):
+		return os.path.exists(self._file(key))
+	def get(self, key, default=None):
+		path = self._file(key)
+		try:
+			with open(path, 'rb') as f:
+				value = pickle.load(f)
+		except (OSError, EOFError, pickle.UnpicklingError):
+			return default
+		os.utime(path)
+		return value
+	def put(self, key, value):
+		path = self._file(key)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+		with os.fdopen(fd, 'wb') as f:
+			pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+		os.replace(tmp, path)
+		self.evict()
+	def entries(self):
+		ret = []
+		for d, dirs, files in os.walk(self.path):
+			for name in files:
+				path = os.path.join(d, name)
+				try:
+					st = os.stat(path)
+				except OSError:
+					continue
+				ret.append((st.st_mtime, st.st_size, path))
+		return ret
+	def size(self):
+		return sum(size for t, size, path in self.entries())
+	def evict(self):
+		entries = sorted(self.entries())
+		total = sum(size for t, size, path in entries)
+		for t, size, path in entries:
+			if total <= self.max_size:
+				break
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+			total -= size
+	def clear(self):
+		for t, size, path in self.entries():
+			os.remove(path)
+
+def cached(method):
+	# Caches a method of an object with `cache` (a DiskCache or None) and `cache_inputs()`.
+	# Arguments are fingerprinted by value, except for objects returned by another cached
+	# method, which stand for the key that produced them; any other argument bypasses the cache.
+	@functools.wraps(method)
+	def _(self, *args, **kwargs):
+		cache = getattr(self, 'cache', None)
+		if cache is None:
+			return method(self, *args, **kwargs)
+		tokens = self.__dict__.setdefault('_cache_tokens', {})
+		try:
+			parts = [_token(tokens, a) or fingerprint(a) for a in args]
+			parts.append(fingerprint(kwargs))
+		except TypeError:
+			return method(self, *args, **kwargs)
+		key = fingerprint(self.cache_inputs(), method.__name__, source_hash(method), parts)
+		value = cache.get(key, DiskCache._missing)
+		if value is DiskCache._missing:
+			value = method(self, *args, **kwargs)
+			cache.put(key, value)
+		try:
+			tokens[id(value)] = key, weakref.ref(value)
+		except TypeError:
+			tokens[id(value)] = key, value
+		return value
+	return _
+
+def _token(tokens, obj):
+	key, ref = tokens.get(id(obj), (None, None))
+	if ref is obj or isinstance(ref, weakref.ref) and ref() is obj:
+		return key
@@ -1,3 +1,6 @@
+import math
+import numpy as np
+
 class Crystal_ball:
 	def __call__(self, x, param):
 		AA, a, sigma, n, x0 = param
@@ -14,3 +17,66 @@ class Crystal_ball:
 			A = pow(n / a_abs, n) * math.exp(-a_abs ** 2 / 2)
 			B = n / a_abs - a_abs
 			return AA * A * pow(B - x, -n)
+
+# Array evaluators of the shapes wrapped in pdf.py, unnormalized as the corresponding
+# RooAbsPdf::evaluate. x is an array, param is one parameter vector (result shaped like x)
+# or a batch of shape (B, npar) (result shaped (B,) + x.shape). Parameters are in the
+# order of the pdf.py constructors.
+def _params(x, param, npar):
+	x = np.asarray(x, dtype=float)
+	param = np.asarray(param, dtype=float)
+	if param.shape[-1:] != (npar,):
+		raise ValueError('expected {0} parameters, got shape {1}'.format(npar, param.shape))
+	return x, [p.reshape(p.shape + (1,) * x.ndim) for p in np.moveaxis(param, -1, 0)]
+
+def gaussian(x, param):
+	# Gaus: mean, sigma
+	x, (mean, sigma) = _params(x, param, 2)
+	return np.exp(-0.5 * ((x - mean) / sigma) ** 2)
+
+def crystal_ball(x, param):
+	# Crys: mean, sigma, asym (alpha), amp (n)
+	x, (mean, sigma, alpha, n) = _params(x, param, 4)
+	t = (x - mean) / sigma
+	t = np.where(alpha < 0, -t, t)
+	a = np.abs(alpha)
+	with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+		tail = np.exp(n * np.log(n / a) - 0.5 * a ** 2 - n * np.log(np.maximum(n / a - a - t, 0)))
+	return np.where(t >= -a, np.exp(-0.5 * t ** 2), tail)
+
+def breit_wigner(x, param):
+	# BW: mean, width
+	x, (mean, width) = _params(x, param, 2)
+	return 1. / ((x - mean) ** 2 + 0.25 * width ** 2)
+
+def argus(x, param):
+	# Argus: m0, c, p
+	x, (m0, c, p) = _params(x, param, 3)
+	t = x / m0
+	u = np.maximum(1 - t ** 2, 0)
+	with np.errstate(invalid='ignore'):
+		return np.where(t >= 1, 0., x * u ** p * np.exp(c * u))
+
+def chebyshev(x, param, lo, hi):
+	# Poly: coefficients c1..cn of T1..Tn on top of T0 = 1, with x mapped from [lo, hi] onto [-1, 1]
+	x = np.asarray(x, dtype=float)
+	param = np.asarray(param, dtype=float)
+	c = np.concatenate([np.ones(param.shape[:-1] + (1,)), param], axis=-1)
+	return np.polynomial.chebyshev.chebval((2 * x - lo - hi) / (hi - lo), np.moveaxis(c, -1, 0).reshape((c.shape[-1],) + param.shape[:-1] + (1,) * x.ndim), tensor=False)
+
+_erf = np.vectorize(math.erf, otypes=[float])
+def gaussian_integral(param, lo, hi):
+	param = np.asarray(param, dtype=float)
+	mean, sigma = param[..., 0], param[..., 1]
+	r2 = math.sqrt(2)
+	return sigma * math.sqrt(math.pi / 2) * (_erf((hi - mean) / (r2 * sigma)) - _erf((lo - mean) / (r2 * sigma)))
+
+def double_gaussian(x, param, lo, hi):
+	# DblGaus: frac, mean1, sigma1, mean2, sigma2; like the RooAddPdf it builds, each
+	# gaussian is normalized on [lo, hi] before mixing, so the result is a density
+	param = np.asarray(param, dtype=float)
+	frac = param[..., 0].reshape(param.shape[:-1] + (1,) * np.ndim(x))
+	g1, g2 = param[..., 1:3], param[..., 3:5]
+	n1 = gaussian_integral(g1, lo, hi).reshape(frac.shape)
+	n2 = gaussian_integral(g2, lo, hi).reshape(frac.shape)
+	return frac * gaussian(x, g1) / n1 + (1 - frac) * gaussian(x, g2) / n2
@@ -1,12 +1,23 @@
-import ROOT as root
+from ..ROOT import root
 import more_itertools
 from typing import Callable
 from abc import ABCMeta, abstractmethod
 import decimal
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 import math, re
+import os
+import struct
+import bisect
+import numpy as np
+import builtins
+import multiprocessing
+import time
 from numbers import Number
 from typing import Any
+from .native import NativeFit, data_arrays
+from .cache import fingerprint, file_identity, source_hash
+from .scope import register, _ref
+from .pdf import DataHist, DataSet
 
 def FormatData(datahist):
 	datahist.SetMarkerStyle(20)
@@ -87,14 +98,237 @@ def RedLine():
 def FitArgs(i):
 	if i == 0:
 		return (root.RooFit.Save(), root.RooFit.Extended(True), root.RooFit.Minos(True))
+	if i == 1:
+		return (NativeFit(),)
 
-def significance(model, data, N_var, nll=None, args=None, Print=None, draw=None):
+class FitSummary(object):
+	def __init__(self, nll, status, values):
+		self.nll = nll
+		self.stat = status
+		self.values = values
+	def minNll(self):
+		return self.nll
+	def status(self):
+		return self.stat
+	def apply(self, params):
+		# sets the fitted values and errors on the parameters, as the fit itself did
+		for p in params:
+			if p.GetName() in self.values:
+				p.setVal(self.values[p.GetName()][0])
+				p.setError(self.values[p.GetName()][1])
+	def __repr__(self):
+		return 'FitSummary(minNll={0}, status={1}, values={2})'.format(self.nll, self.stat, self.values)
+
+class FitCache(object):
+	# Opt-in memo of fits: put among the fit arguments (e.g. FitArgs(0) + (FitCache(),)) of
+	# likelihood, significance and the other helpers, a fit of the same model structure, data,
+	# fit arguments, fixed/floating flags, ranges and start values as an earlier one returns
+	# that fit's FitSummary and sets the parameters to its results without fitting. Summaries
+	# are kept in memory (the `size` most recently used) and in `disk`, a DiskCache, if given.
+	def __init__(self, size=1024, disk=None):
+		self.size = size
+		self.disk = disk
+		self.memory = OrderedDict()
+		self.data_keys = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+	def data_key(self, data):
+		# content hash of a dataset, computed once per dataset object; the `size` most recent
+		# are kept, since a dataset that cannot be weakly referenced is held until dropped here
+		ref, key = self.data_keys.get(id(data), (None, None))
+		if ref is not None and ref() is data:
+			self.data_keys.move_to_end(id(data))
+		else:
+			if data.InheritsFrom('RooDataHist'):
+				counts, edges = DataHist.to_array(data)
+				content = counts, edges
+			else:
+				content = sorted(DataSet.to_arrays(data).items())
+			key = fingerprint(data.ClassName(), [x.GetName() for x in data.get()], content)
+			self.data_keys.pop(id(data), None)
+			self.data_keys[id(data)] = _ref(data), key
+			while len(self.data_keys) > self.size:
+				self.data_keys.popitem(False)
+		return key
+	def model_key(self, model, data):
+		pdf = getattr(model, 'pdf', model)
+		nodes = sorted((x.ClassName(), x.GetName(), x.GetTitle()) for x in pdf.getComponents())
+		params = sorted((p.GetName(), p.getVal(), bool(p.isConstant()), p.getMin(), p.getMax()) for p in model.getParameters(data) if p.InheritsFrom('RooRealVar'))
+		return nodes, params
+	def get(self, key):
+		if key in self.memory:
+			self.memory.move_to_end(key)
+			return self.memory[key]
+		ret = self.disk.get(key) if self.disk is not None else None
+		if ret is not None:
+			self._remember(key, ret)
+		return ret
+	def put(self, key, summary):
+		self._remember(key, summary)
+		if self.disk is not None:
+			self.disk.put(key, summary)
+	def _remember(self, key, summary):
+		self.memory[key] = summary
+		while len(self.memory) > self.size:
+			self.memory.popitem(False)
+	def fit(self, model, data, args):
+		try:
+			key = fingerprint(self.model_key(model, data), self.data_key(data), [_arg_key(arg, self.data_key) for arg in args])
+		except TypeError:
+			return model.fitTo(data, *args)
+		params = model.getParameters(data)
+		ret = self.get(key)
+		if ret is None:
+			self.misses += 1
+			res = model.fitTo(data, *args)
+			ret = FitSummary(res.minNll(), res.status(), dict((p.GetName(), (p.getVal(), p.getError())) for p in params if p.InheritsFrom('RooRealVar')))
+			self.put(key, ret)
+		else:
+			self.hits += 1
+			ret.apply(params)
+		return ret
+
+def _arg_key(arg, data_key):
+	# everything a RooCmdArg carries: numbers, strings, objects and sets by name and value,
+	# and its nested arguments; raises TypeError for a payload it cannot key, and FitCache
+	# then fits without the cache
+	if isinstance(arg, NativeFit):
+		return 'NativeFit', sorted(vars(arg).items())
+	objects = [_object_key(arg.getObject(i), data_key) for i in range(2)]
+	sets = [_object_key(arg.getSet(i), data_key) for i in range(2)]
+	subs = [_arg_key(sub, data_key) for sub in arg.subArgs()]
+	return arg.GetName(), [arg.getInt(i) for i in range(2)], [arg.getDouble(i) for i in range(2)], [arg.getString(i) or '' for i in range(3)], objects, sets, subs
+
+def _object_key(obj, data_key):
+	if not obj:
+		return None
+	if obj.InheritsFrom('RooAbsCollection'):
+		return [_object_key(x, data_key) for x in obj]
+	if obj.InheritsFrom('RooAbsData'):
+		return data_key(obj)
+	if obj.InheritsFrom('RooRealVar'):
+		return obj.GetName(), obj.getVal(), bool(obj.isConstant()), obj.getMin(), obj.getMax()
+	if obj.InheritsFrom('RooAbsCategory'):
+		return obj.GetName(), obj.getCurrentIndex()
+	if obj.InheritsFrom('RooAbsReal'):
+		# a pdf or function, e.g. an external constraint: its structure and its parameters
+		nodes = sorted((x.ClassName(), x.GetName(), x.GetTitle()) for x in obj.getComponents())
+		return nodes, [_object_key(x, data_key) for x in obj.getVariables()]
+	raise TypeError('cannot key fit argument payload {0}'.format(obj.ClassName()))
+
+def _fit(model, data, args):
+	# model.fitTo(data, *args), through the FitCache among args if there is one
+	for arg in args:
+		if isinstance(arg, FitCache):
+			return arg.fit(model, data, tuple(a for a in args if a is not arg))
+	return model.fitTo(data, *args)
+
+class FitDataPolicy(object):
+	# Binned fits for large samples: prepare() turns a DataSet of more than `threshold` events
+	# into a DataHist of the observable, with `bins` bins or else one bin per 1/per_sigma of the
+	# narrowest resolution (a Var in a 'sigma' slot) in the model, within [min_bins, max_bins].
+	# Conversions are kept per dataset and model (the `keep` most recent), so a scan bins its
+	# data once; they are not pickled with the policy, e.g. into spawned scan workers.
+	def __init__(self, threshold=200000, bins=None, per_sigma=4., min_bins=100, max_bins=2000, keep=4):
+		self.threshold = threshold
+		self.bins = bins
+		self.per_sigma = per_sigma
+		self.min_bins = min_bins
+		self.max_bins = max_bins
+		self.keep = keep
+		self.converted = OrderedDict()
+	def __getstate__(self):
+		state = dict(self.__dict__)
+		state['converted'] = OrderedDict()
+		return state
+	def binning(self, model, X):
+		if self.bins is not None:
+			return self.bins
+		sigma = _resolution(model)
+		if not sigma:
+			return self.max_bins
+		n = int(math.ceil((X.getMax() - X.getMin()) * self.per_sigma / sigma))
+		return builtins.min(builtins.max(n, self.min_bins), self.max_bins)
+	def prepare(self, model, data, X=None, force=False):
+		if not data.InheritsFrom('RooDataSet') or not force and data.sumEntries() <= self.threshold:
+			return data
+		key = id(data), id(model)
+		if key in self.converted:
+			self.converted.move_to_end(key)
+		else:
+			# the dataset is kept with its conversion, so that its id is not reused meanwhile
+			self.converted[key] = data, self.convert(model, data, X)
+			while len(self.converted) > self.keep:
+				self.converted.popitem(False)
+		return self.converted[key][1]
+	def convert(self, model, data, X=None):
+		X = _observable(model) if X is None else X
+		X = getattr(X, 'var', X)
+		nbins = X.getBins()
+		X.setBins(self.binning(model, X))
+		try:
+			# a set, for the RooDataHist(name, title, vars, data) constructor
+			return DataHist((X,), data, data.GetName() + '_binned')
+		finally:
+			X.setBins(nbins)
+	def validate(self, model, data, sample=None, X=None, args=None):
+		# fits the first `sample` events (default: threshold) unbinned and binned from the same
+		# start and reports, per floating parameter, both results and their difference in
+		# units of the unbinned error
+		args = tuple(FitArgs(0) if args is None else args) + (root.RooFit.PrintLevel(-1),)
+		sample = sample or self.threshold
+		sub = data.reduce(root.RooFit.EventRange(0, sample))
+		root.SetOwnership(sub, True)
+		binned = self.convert(model, sub, X)
+		params = model.getParameters(sub)
+		start = params.snapshot()
+		report = {'events': sub.numEntries(), 'bins': binned.numEntries()}
+		fits = {}
+		for key, d in (('unbinned', sub), ('binned', binned)):
+			params.assignValueOnly(start)
+			t = time.perf_counter()
+			res = _fit(model, d, args)
+			report['time_' + key] = time.perf_counter() - t
+			report['nll_' + key] = res.minNll()
+			fits[key] = dict((p.GetName(), (p.getVal(), p.getError())) for p in params if not p.isConstant())
+		params.assignValueOnly(start)
+		report['params'] = dict((name, fits['unbinned'][name] + fits['binned'][name] + ((fits['binned'][name][0] - val) / err if err > 0 else float('nan'),)) for name, (val, err) in fits['unbinned'].items())
+		return report
+
+def _observable(model):
+	if hasattr(model, 'X'):
+		return model.X
+	if hasattr(model, 'pair'):
+		return model.pair[0][1].X
+	raise TypeError('no observable known for {0!r}, pass X'.format(model))
+
+def _resolution(model):
+	# narrowest width parameter of the pdfs of a UGFlib model
+	if hasattr(model, 'pair'):
+		widths = [_resolution(pdf) for var, pdf in model.pair]
+	elif hasattr(model, 'pdfs'):
+		widths = [_resolution(pdf) for pdf in model.pdfs]
+	elif hasattr(model, 'args_default'):
+		widths = [abs(v.getVal()) for name, v in zip(model.args_default, model.l) if name.startswith('sigma')]
+	else:
+		return None
+	widths = [w for w in widths if w]
+	return builtins.min(widths) if widths else None
+
+def _significance(nll0, nll):
+	if nll0 < nll:
+		return -(2 * (nll - nll0)) ** 0.5
+	return (2 * (nll0 - nll)) ** 0.5
+
+def significance(model, data, N_var, nll=None, args=None, Print=None, draw=None, policy=None):
 	if args is None:
 		args = FitArgs(0)
+	if policy is not None:
+		data = policy.prepare(model, data)
 	tmp = N_var.getVal()
 	N_var.setVal(0)
 	N_var.setConstant(True)
-	nll0 = model.fitTo(data, *args).minNll()
+	nll0 = _fit(model, data, args).minNll()
 	if draw is not None:
 		c = draw()
 		#from getpass import getpass
@@ -102,14 +336,85 @@ def significance(model, data, N_var, nll=None, args=None, Print=None, draw=None)
 	N_var.setVal(tmp)
 	N_var.setConstant(False)
 	if nll is None:
-		nll = model.fitTo(data, *args).minNll()
+		nll = _fit(model, data, args).minNll()
 	if Print is not None:
 		Print(('N_var, nll, nll0: ', float(N_var), nll, nll0))
-	if nll0 < nll:
+	if nll0 < nll and Print is not None:
+		Print('Sni wrong!')
+	return _significance(nll0, nll)
+
+SignificanceResult = namedtuple('SignificanceResult', 'significance, nll0, nll, wrong_sign, time_null, time_alt')
+
+def _significance_fit(model, data, N_var, null, args):
+	t = time.perf_counter()
+	tmp = N_var.getVal()
+	if null:
+		N_var.setVal(0)
+	N_var.setConstant(null)
+	try:
+		nll = _fit(model, data, args).minNll()
+	finally:
+		N_var.setVal(tmp)
+		N_var.setConstant(False)
+	return nll, time.perf_counter() - t
+
+# per-process state of significance_batch, inherited through fork
+_significance_state = {}
+def _significance_worker(task):
+	j, null = task
+	model, data, N_var = _significance_state['jobs'][j][:3]
+	return task, _significance_fit(model, data, N_var, null, _significance_state['args'])
+
+def significance_batch(jobs, workers=None, scans=None, args=None, Print=None, policy=None):
+	# jobs are (model, data, N_var) or (model, data, N_var, nll) with a known alternative nll.
+	# scans[j], a likelihood() scan of job j, supplies the null fit as its N = 0 point.
+	# Repeated jobs (same model, data and N_var objects, and the same known nll and scanned
+	# nll0) are fitted once; with workers=N all null and alternative fits run concurrently in N
+	# forked processes. Times of reused fits are 0. Serial fits leave the model parameters at
+	# the last fit result; fits in workers do not change the parameters in this process.
+	if args is None:
+		args = FitArgs(0)
+	jobs = [tuple(job) for job in jobs]
+	if policy is not None:
+		jobs = [(job[0], policy.prepare(job[0], job[1])) + job[2:] for job in jobs]
+	known = []
+	for j, job in enumerate(jobs):
+		try:
+			point = scans[j][0] if scans is not None else None
+		except (IndexError, KeyError, TypeError):
+			point = None
+		# (0, 0) marks a point the scan ignored or could not fit; any other nll, 0 included, is real
+		nll0 = None if point is None or point == (0, 0) else point[1]
+		known.append((nll0, job[3] if len(job) > 3 else None))
+	keys = [(id(job[0]), id(job[1]), id(job[2])) + known[j] for j, job in enumerate(jobs)]
+	first = {}
+	for j, key in enumerate(keys):
+		first.setdefault(key, j)
+	owner = [first[key] for key in keys]
+	fits = {}
+	for j, (nll0, nll) in enumerate(known):
+		if nll is not None:
+			fits[owner[j], False] = nll, 0.
+		if nll0 is not None:
+			fits[owner[j], True] = nll0, 0.
+	tasks = [(j, null) for j in sorted(set(owner)) for null in (True, False) if (j, null) not in fits]
+	if workers and workers > 1 and len(tasks) > 1:
+		_significance_state.update(jobs=jobs, args=args)
+		try:
+			with multiprocessing.get_context('fork').Pool(workers) as pool:
+				done = pool.map(_significance_worker, tasks, 1)
+		finally:
+			_significance_state.clear()
+	else:
+		done = [(task, _significance_fit(*(jobs[task[0]][:3] + (task[1], args)))) for task in tasks]
+	fits.update(done)
+	ret = []
+	for j in range(len(jobs)):
+		(nll0, t0), (nll, t1) = fits[owner[j], True], fits[owner[j], False]
 		if Print is not None:
-			Print('Sni wrong!')
-		return -(2 * (nll - nll0)) ** 0.5
-	return (2 * (nll0 - nll)) ** 0.5
+			Print((j, 'nll, nll0: ', nll, nll0))
+		ret.append(SignificanceResult(_significance(nll0, nll), nll0, nll, nll0 < nll, t0, t1))
+	return ret
 
 def drange(start, stop, step=1):
 	while start < stop:
@@ -122,73 +427,149 @@ class _Likelihood(object):
 	item = namedtuple('item', 'n, val, nll')
 	cache = []
 	def __init__(self):
-		self.data = []
+		# exact (Decimal) keys in ascending order, their positions, and the columns as arrays
+		self._keys = []
+		self._index = {}
+		self._n = np.empty(16)
+		self._val = np.empty(16)
+		self._nll = np.empty(16)
+		self._size = 0
+	@classmethod
+	def _from_arrays(cls, keys, val, nll):
+		l = cls()
+		l._keys = list(keys)
+		l._index = {k: i for i, k in enumerate(l._keys)}
+		l._n = np.array([float(k) for k in l._keys])
+		l._val = np.asarray(val, dtype=float)
+		l._nll = np.asarray(nll, dtype=float)
+		l._size = len(l._keys)
+		return l
+	def _grow(self):
+		cap = 2 * self._size or 16
+		for name in ('_n', '_val', '_nll'):
+			arr = np.empty(cap)
+			arr[:self._size] = getattr(self, name)[:self._size]
+			setattr(self, name, arr)
+	@property
+	def n(self):
+		return self._n[:self._size]
+	@property
+	def val(self):
+		return self._val[:self._size]
+	@property
+	def nll(self):
+		return self._nll[:self._size]
+	@property
+	def keys(self):
+		return self._keys
+	@property
+	def data(self):
+		return list(self)
+	def __len__(self):
+		return self._size
 	def __setitem__(self, index, item):
-		it = _Likelihood.item(index, *item)
-		for i, (n, val, nll) in enumerate(self.data):
-			if n == index:
-				self.data[i] = it
-				return
-		self.data.append(it)
+		val, nll = item
+		i = self._index.get(index)
+		if i is None:
+			if self._size == len(self._n):
+				self._grow()
+			if self._keys and index < self._keys[-1]:
+				i = bisect.bisect(self._keys, index)
+				for arr in (self._n, self._val, self._nll):
+					arr[i + 1:self._size + 1] = arr[i:self._size]
+				self._keys.insert(i, index)
+				for k in self._keys[i + 1:]:
+					self._index[k] += 1
+			else:
+				i = self._size
+				self._keys.append(index)
+			self._index[index] = i
+			self._n[i] = float(index)
+			self._size += 1
+		self._val[i] = val
+		self._nll[i] = nll
 	def __getitem__(self, index):
-		for n, val, nll in self.data:
-			if n == index:
-				return val, nll
-		raise IndexError
+		i = self._index.get(index)
+		if i is None:
+			raise IndexError
+		return float(self._val[i]), float(self._nll[i])
 	def __iter__(self):
-		return iter(self.data)
+		return map(_Likelihood.item._make, zip(self._keys, self.val.tolist(), self.nll.tolist()))
 	def upper_limit(self, CL=0.9):
-		s = 0
-		for n, val, nll in self:
-			s += val
-		p = 0
-		for x in self:
-			p += x.val
-			if p >= CL * s:
-				return x
+		# first point at which the cumulative likelihood reaches CL of the total, for one CL or many
+		cls = np.atleast_1d(np.asarray(CL, dtype=float))
+		ret = [None] * len(cls)
+		if self._size:
+			cum = np.cumsum(self.val)
+			for j, i in enumerate(np.searchsorted(cum, cls * cum[-1], side='left').tolist()):
+				if i < self._size:
+					ret[j] = _Likelihood.item(self._keys[i], float(self._val[i]), float(self._nll[i]))
+		return ret if np.ndim(CL) else ret[0]
 	def __str__(self):
 		return '\n'.join(['{0} {1}'.format(n, val) for n, val, nll in self.data])
-	def conv(self, err, trunc=7):
-		l2 = _Likelihood()
-		step = float(self.data[1][0] - self.data[0][0])
-		for x, y, nll in self:
-			l2[x] = 0., 0.
-			for x2, y2, nll in self:
-				if x2 != 0 and x != 0:
-					l2[x] = l2[x][0] + y2 * math.exp(-float(x2 - x) ** 2 / (2 * (err * float(x2)) ** 2)) / (math.sqrt(2 * math.pi) * err * float(x2)) * step, 0.
-		d = (l2.data[trunc + 1][1] - l2.data[trunc][1]) * 1.0 / step
-		for i in range(trunc):
-			l2[l2.data[i][0]] = l2.data[trunc][1] - (trunc - i) * d, 0.
-		return l2
+	def conv(self, err, trunc=7, nsigma=None, chunk=256):
+		# Gaussian smearing with relative width err, as a kernel matrix applied in row chunks;
+		# nsigma cuts the kernel off, restricting each chunk to the band it can reach.
+		# err may be a sequence, giving one _Likelihood per value.
+		errs = np.atleast_1d(np.asarray(err, dtype=float))
+		x = self.n
+		step = float(self._keys[1] - self._keys[0])
+		src = np.flatnonzero(x != 0)
+		xs = x[src]
+		ys = self.val[src] * step / (math.sqrt(2 * math.pi) * xs)
+		out = np.zeros((len(errs), self._size))
+		for row, e in zip(out, errs):
+			sigma = e * xs
+			for i in range(0, len(src), chunk):
+				xc, sc = xs[i:i + chunk, None], sigma[i:i + chunk, None]
+				if nsigma is None:
+					lo, hi = 0, self._size
+				else:
+					lo = np.searchsorted(x, (xc - nsigma * np.abs(sc)).min(), 'left')
+					hi = np.searchsorted(x, (xc + nsigma * np.abs(sc)).max(), 'right')
+				d = x[None, lo:hi] - xc
+				kernel = np.exp(-d ** 2 / (2 * sc ** 2))
+				if nsigma is not None:
+					kernel[np.abs(d) > nsigma * np.abs(sc)] = 0.
+				row[lo:hi] += (ys[i:i + chunk] / e) @ kernel
+		out[:, x == 0] = 0.
+		d = (out[:, trunc + 1] - out[:, trunc]) / step
+		out[:, :trunc] = out[:, trunc, None] - (trunc - np.arange(trunc)) * d[:, None]
+		ret = [_Likelihood._from_arrays(self._keys, row, np.zeros(self._size)) for row in out]
+		return ret if np.ndim(err) else ret[0]
 	def save(self, f):
-		for n, val, nll in self.data:
-			f.writeline('{0} {1}'.format(n, val))
+		for n, val, nll in self:
+			f.write('{0} {1} {2}\n'.format(n, val, nll))
+	def dump(self, path, name=''):
+		# appends the scan as a named record to a binary catalogue, see load_binary
+		with open(path, 'ab') as f:
+			_write_record(f, name, self)
+	@staticmethod
+	def dump_all(path, scans):
+		with open(path, 'ab') as f:
+			for name, l in scans.items():
+				_write_record(f, name, l)
 	def enlong(self, end):
-		step = self.data[1][0] - self.data[0][0]
-		for i in drange(self.data[-1][0] + step, end, step):
+		step = self._keys[1] - self._keys[0]
+		for i in drange(self._keys[-1] + step, end, step):
 			self[i] = (0, 0)
 	@staticmethod
 	def load_str(f):
-		import re
-		l = _Likelihood()
-		for line in f.split('\n'):
-			match = re.match(r'(\d+(?:\.\d+)?) (\d+(?:\.\d+)?(?:e-?\d+)?)', line.strip())
-			if not match:
-				raise ValueError(line)
-			n, val = match.group(1), match.group(2)
-			l[decimal.Decimal(n)] = float(val), 0.
-		return l
+		return _Likelihood.load(line for line in f.split('\n') if line.strip())
 	@staticmethod
 	def load(f):
-		import re
 		l = _Likelihood()
 		for line in f:
-			match = re.match(r'(\d+(?:\.\d+)?) (\d+(?:\.\d+)?(?:e-?\d+)?)', line)
+			match = re.match(r'(\d+(?:\.\d+)?) (\d+(?:\.\d+)?(?:e[-+]?\d+)?)(?: (-?\d+(?:\.\d+)?(?:e[-+]?\d+)?))?', line.strip())
 			if not match:
 				raise ValueError(line)
-			n, val = match.group(1), match.group(2)
-			l[decimal.Decimal(n)] = float(val), 0.
+			n, val, nll = match.groups()
+			l[decimal.Decimal(n)] = float(val), float(nll or 0.)
 		return l
+	@staticmethod
+	def load_binary(path, name=None):
+		cat = _LikelihoodFile(path)
+		return cat if name is None else cat[name]
 	def plot(self, E=None, U=False, if_pause=False):
 		# E = ((0.3, 0.8), 4600, [0.10]) or E = 4600
 		# U = 0.9 or U = True
@@ -219,56 +600,100 @@ class _Likelihood(object):
 			from getpass import getpass
 			getpass('Enter...')
 		_Likelihood.cache.append(g)
+		register('TGraph', g, _Likelihood.cache)
 		if U == True:
 			return n
 
-def likelihood(model, data, N_var, step=decimal.Decimal('0.1'), max=40, prnt=None, init=None, interpolation=None, args=None, ignore=(), extra_plot=None, must_init=False):
-	if args is None:
-		args = FitArgs(0)
-	if isinstance(interpolation, Number):
-		from copy import copy
-		interpolation = ((copy(interpolation),),)
-	tmp = N_var.getVal()
-	N_var.setConstant(True)
-	l = _Likelihood()
-	nll0 = None
-	for i in drange(0, max, step):
-		if must_init and init:
+# Binary catalogue of scans: a sequence of records, each a header (magic, name length,
+# decimal exponent of the keys, point count), the utf-8 name padded to 8 bytes, then
+# int64 keys (n = key * 10 ** exponent), float64 val and float64 nll. Keys that do not fit
+# in int64 that way (e.g. floats with long decimal expansions) are stored as float64, with
+# exponent _FLOAT_KEYS, and load as floats.
+_record = struct.Struct('<4sHhI')
+_FLOAT_KEYS = -0x8000
+def _write_record(f, name, l):
+	exp = min([decimal.Decimal(k).as_tuple().exponent for k in l.keys] or [0])
+	scaled = [int(decimal.Decimal(k).scaleb(-exp)) for k in l.keys]
+	if _FLOAT_KEYS < exp < 0x8000 and all(-2 ** 63 <= k < 2 ** 63 for k in scaled):
+		keys = np.array(scaled, dtype='<i8')
+	else:
+		exp, keys = _FLOAT_KEYS, np.array([float(k) for k in l.keys], dtype='<f8')
+	name = name.encode('utf-8')
+	f.write(_record.pack(b'UGFL', len(name), exp, len(keys)))
+	f.write(name + b'\0' * (-(_record.size + len(name)) % 8))
+	f.write(keys.tobytes())
+	f.write(np.ascontiguousarray(l.val, dtype='<f8').tobytes())
+	f.write(np.ascontiguousarray(l.nll, dtype='<f8').tobytes())
+
+class _LikelihoodFile(object):
+	# Maps the catalogue copy-on-write and only reads record headers; a scan is built,
+	# on views into the mapping, when it is first looked up.
+	def __init__(self, path):
+		self.path = path
+		self.records = {}
+		self.scans = {}
+		self.mm = np.memmap(path, mode='c') if os.path.getsize(path) else np.empty(0, dtype=np.uint8)
+		offset = 0
+		while offset < len(self.mm):
+			magic, ln, exp, count = _record.unpack_from(self.mm, offset)
+			if magic != b'UGFL':
+				raise ValueError('{0}: bad record at byte {1}'.format(path, offset))
+			offset += _record.size
+			name = bytes(self.mm[offset:offset + ln]).decode('utf-8')
+			offset += ln + (-(_record.size + ln) % 8)
+			self.records[name] = offset, exp, count
+			self.scans.pop(name, None)
+			offset += 24 * count
+	def __getitem__(self, name):
+		if name not in self.scans:
+			offset, exp, count = self.records[name]
+			val = np.frombuffer(self.mm, '<f8', count, offset + 8 * count)
+			nll = np.frombuffer(self.mm, '<f8', count, offset + 16 * count)
+			if exp == _FLOAT_KEYS:
+				keys = np.frombuffer(self.mm, '<f8', count, offset).tolist()
+			else:
+				keys = [decimal.Decimal(k).scaleb(exp) for k in np.frombuffer(self.mm, '<i8', count, offset).tolist()]
+			self.scans[name] = _Likelihood._from_arrays(keys, val, nll)
+		return self.scans[name]
+	def __contains__(self, name):
+		return name in self.records
+	def __iter__(self):
+		return iter(self.records)
+	def __len__(self):
+		return len(self.records)
+	def keys(self):
+		return self.records.keys()
+	def items(self):
+		return ((name, self[name]) for name in self.records)
+
+def _scan_point(model, data, N_var, i, nll0, args, prnt=None, init=None):
+	N_var.setVal(i)
+	nll = _fit(model, data, args).minNll()
+	if nll0 is None:
+		nll0 = nll
+	if prnt:
+		prnt((i, nll))
+	try:
+		return math.exp(nll0 - nll), nll
+	except OverflowError:
+		if init:
 			init()
-		if i in ignore:
-			l[i] = 0, 0
+			nll = _fit(model, data, args).minNll()
 			if prnt:
 				prnt((i, nll))
-			continue
-		N_var.setVal(i)
-		nll = model.fitTo(data, *args).minNll()
-		if i == 0:
-			nll0 = nll
-		if prnt:
-			prnt((i, nll))
-		try:
-			l[i] = math.exp(nll0 - nll), nll
-		except OverflowError:
-			l[i] = 0, 0
-			if init:
-				init()
-				nll = model.fitTo(data, *args).minNll()
-				if prnt:
-					prnt((i, nll))
-				try:
-					l[i] = math.exp(nll0 - nll), nll
-				except OverflowError:
-					l[i] = 0, 0
-		if extra_plot is not None:
-			extra_plot(i)
-	N_var.setConstant(False)
-	N_var.setVal(tmp)
+			try:
+				return math.exp(nll0 - nll), nll
+			except OverflowError:
+				pass
+		return 0, 0
+
+def _scan_interpolate(l, step, interpolation, prnt=None):
 	if not interpolation:
 		interpolation = []
 	else:
 		interpolation = list(interpolation)
 	for i, ((n1, val1, nll1), (n2, val2, nll2), (n3, val3, nll3)) in enumerate(more_itertools.windowed(l, 3)):
-		if (nll1 < nll2 and nll2 > nll3 or nll1 > nll2 and nll2 < nll3) and i >= 1 and abs(nll2 - nll1) > 2 * abs(l.data[i - 1].nll - nll1):
+		if (nll1 < nll2 and nll2 > nll3 or nll1 > nll2 and nll2 < nll3) and i >= 1 and abs(nll2 - nll1) > 2 * abs(l.nll[i - 1] - nll1):
 			interpolation.append((n2,))
 	if interpolation:
 		for chunk in interpolation:
@@ -283,11 +708,215 @@ def likelihood(model, data, N_var, step=decimal.Decimal('0.1'), max=40, prnt=Non
 					prnt((index, l[index]))
 	return l
 
+# per-process state of the parallel scan, inherited through fork or set up by `build`
+_scan_state = {}
+def _scan_worker_init(state, build=None):
+	_scan_state.update(state)
+	if build is not None:
+		built = build()
+		_scan_state['model'], _scan_state['data'], _scan_state['N_var'] = built[:3]
+		_scan_state['args'] = built[3] if len(built) > 3 else FitArgs(0)
+		if _scan_state['policy'] is not None:
+			_scan_state['data'] = _scan_state['policy'].prepare(_scan_state['model'], _scan_state['data'])
+		_scan_state['N_var'].setConstant(True)
+def _scan_worker(i):
+	# returns what prnt would have been called with, for the parent to print in order
+	st = _scan_state
+	if st['must_init'] and st['init']:
+		st['init']()
+	printed = []
+	ret = _scan_point(st['model'], st['data'], st['N_var'], i, st['nll0'], st['args'], printed.append, st['init'])
+	return i, ret, printed
+
+def likelihood(model, data, N_var, step=decimal.Decimal('0.1'), max=40, prnt=None, init=None, interpolation=None, args=None, ignore=(), extra_plot=None, must_init=False, workers=None, build=None, policy=None):
+	# workers=N fits the grid in N processes. Without `build` the workers are forked and
+	# share the model as it is now; `build()` returning (model, data, N_var[, args]) rebuilds
+	# it in every (spawned) worker instead, for models that do not survive a fork.
+	# With a FitDataPolicy, large datasets are fitted binned.
+	if args is None:
+		args = FitArgs(0)
+	if policy is not None:
+		data = policy.prepare(model, data)
+	if isinstance(interpolation, Number):
+		from copy import copy
+		interpolation = ((copy(interpolation),),)
+	tmp = N_var.getVal()
+	N_var.setConstant(True)
+	l = _Likelihood()
+	nll0 = None
+	nll = None
+	points = list(drange(0, max, step))
+	# the likelihood is relative to the first point not ignored, normally N = 0; it is fitted
+	# here, and with workers the points after it in the pool
+	ref = next((k for k, i in enumerate(points) if i not in ignore), len(points))
+	if workers and workers > 1:
+		serial, rest = points[:ref + 1], [i for i in points[ref + 1:] if i not in ignore]
+	else:
+		serial, rest = points, []
+	for i in serial:
+		if must_init and init:
+			init()
+		if i in ignore:
+			l[i] = 0, 0
+			if prnt:
+				prnt((i, nll))
+			continue
+		l[i] = val, nll = _scan_point(model, data, N_var, i, nll0, args, prnt, init)
+		if nll0 is None:
+			nll0 = nll
+		if extra_plot is not None:
+			extra_plot(i)
+	if rest:
+		for i in points[ref + 1:]:
+			if i in ignore:
+				l[i] = 0, 0
+		# prnt and extra_plot run here, in order, on the results of the workers
+		state = dict(nll0=nll0, must_init=must_init, init=init, policy=policy)
+		if build is None:
+			state.update(model=model, data=data, N_var=N_var, args=args)
+			ctx = multiprocessing.get_context('fork')
+		else:
+			ctx = multiprocessing.get_context('spawn')
+		chunksize = len(rest) // (workers * 4) or 1
+		with ctx.Pool(workers, _scan_worker_init, (state, build)) as pool:
+			for i, item, printed in pool.imap(_scan_worker, rest, chunksize):
+				l[i] = item
+				if prnt:
+					for line in printed:
+						prnt(line)
+				if extra_plot is not None:
+					extra_plot(i)
+	N_var.setConstant(False)
+	N_var.setVal(tmp)
+	return _scan_interpolate(l, step, interpolation, prnt)
+
+def likelihood_adaptive(model, data, N_var, step=decimal.Decimal('0.1'), max=40, CL=0.9, coarse=8, rtol=0.1, ctol=0.1, tail=1e-3, prnt=None, init=None, interpolation=None, args=None, ignore=(), extra_plot=None, must_init=False, policy=None):
+	# Fits every `coarse`-th point of the grid, bisects intervals where the likelihood
+	# (rtol, relative to the peak) or its CDF (ctol, relative to the integral so far) moves
+	# fast, and stops once the extrapolated tail is below tail * (1 - CL) of the integral.
+	# Each fit starts from the parameters of the nearest fitted point; skipped grid points
+	# are interpolated in nll. Points in `ignore` are never fitted and are 0, as in likelihood().
+	if args is None:
+		args = FitArgs(0)
+	if policy is not None:
+		data = policy.prepare(model, data)
+	if isinstance(interpolation, Number):
+		from copy import copy
+		interpolation = ((copy(interpolation),),)
+	tmp = N_var.getVal()
+	N_var.setConstant(True)
+	grid = list(drange(0, max, step))
+	points = [i for i in grid if i not in ignore]
+	params = model.getParameters(data)
+	fitted = {}
+	snaps = {}
+	nll0 = [None]
+	def fit(k):
+		if must_init and init:
+			init()
+		elif snaps:
+			params.assignValueOnly(snaps[min(snaps, key=lambda j: abs(j - k))])
+		fitted[k] = _scan_point(model, data, N_var, points[k], nll0[0], args, prnt, init)
+		snaps[k] = params.snapshot()
+		if nll0[0] is None:
+			nll0[0] = fitted[k][1]
+		if extra_plot is not None:
+			extra_plot(points[k])
+		return fitted[k][0]
+	def area():
+		ks = sorted(fitted)
+		return sum((fitted[a][0] + fitted[b][0]) * 0.5 * (b - a) for a, b in zip(ks, ks[1:]))
+	def refine(a, b, peak, total):
+		if b - a <= 1:
+			return
+		va, vb = fitted[a][0], fitted[b][0]
+		if abs(va - vb) <= rtol * peak and (va + vb) * 0.5 * (b - a) <= ctol * total:
+			return
+		m = (a + b) // 2
+		fit(m)
+		refine(a, m, peak, total)
+		refine(m, b, peak, total)
+	k = 0
+	if points:
+		fit(0)
+	while k < len(points) - 1:
+		k2 = min(k + coarse, len(points) - 1)
+		v1, v2 = fitted[k][0], fit(k2)
+		refine(k, k2, builtins.max(v[0] for v in fitted.values()), area())
+		k, h = k2, k2 - k
+		# a likelihood that underflowed to 0 has no tail left
+		if v2 <= 0 or v2 < v1 and v2 * h / math.log(v1 / v2) < tail * (1 - CL) * area():
+			break
+	N_var.setConstant(False)
+	N_var.setVal(tmp)
+	if prnt:
+		prnt(('fits', len(fitted), 'points', k + 1))
+	l = _Likelihood()
+	for i in grid:
+		if i in ignore and (not points or i <= points[k]):
+			l[i] = 0, 0
+	x = [float(i) for i in points]
+	ks = sorted(fitted)
+	for ia, (a, b) in enumerate(zip(ks, ks[1:])):
+		(va, nlla), (vb, nllb) = fitted[a], fitted[b]
+		l[points[a]] = va, nlla
+		# quadratic in nll through the neighbouring fitted point, exact for a gaussian likelihood
+		c = ks[ia + 2] if ia + 2 < len(ks) else ks[ia - 1] if ia >= 1 else None
+		quad = c is not None and va and vb and fitted[c][0]
+		xa, xb = x[a], x[b]
+		for j in range(a + 1, b):
+			xj = x[j]
+			if quad:
+				nllc, xc = fitted[c][1], x[c]
+				nll = nlla * (xj - xb) * (xj - xc) / ((xa - xb) * (xa - xc)) + nllb * (xj - xa) * (xj - xc) / ((xb - xa) * (xb - xc)) + nllc * (xj - xa) * (xj - xb) / ((xc - xa) * (xc - xb))
+			elif va and vb:
+				nll = nlla + (xj - xa) / (xb - xa) * (nllb - nlla)
+			else:
+				l[points[j]] = va + (xj - xa) / (xb - xa) * (vb - va), 0
+				continue
+			try:
+				l[points[j]] = math.exp(nll0[0] - nll), nll
+			except OverflowError:
+				l[points[j]] = 0, 0
+	if ks:
+		l[points[ks[-1]]] = fitted[ks[-1]]
+	return _scan_interpolate(l, step, interpolation, prnt)
+
 class FOM:
 	__metaclass__ = ABCMeta
-	def __init__(self, cutRange):
+	# With a DiskCache as `cache`, (s, b) per cut is stored under a key made of the files in
+	# `input_files` and of any instance attribute naming a file, the other instance attributes,
+	# the source of the read/cut/signal/background methods and the cut, and process() only
+	# reads the MC when some cut is missing. Subclasses can also decorate their
+	# read_excMC/read_incMC/apply_cut with `cached` to store the datasets themselves.
+	input_files = ()
+	_uncached_attrs = ('val', 'max', 'cache', 'cutRange', '_cache_tokens')
+	def __init__(self, cutRange, cache=None):
 		self.val = []
 		self.cutRange = cutRange
+		self.cache = cache
+	def cache_inputs(self):
+		cls = type(self)
+		files = list(self.input_files)
+		state = []
+		for name, value in sorted(vars(self).items()):
+			if name in self._uncached_attrs:
+				continue
+			if isinstance(value, str) and os.path.isfile(value):
+				files.append(value)
+			try:
+				state.append((name, fingerprint(value)))
+			except TypeError:
+				# not hashable by value: repr, which for most objects only matches the same object
+				state.append((name, repr(value)))
+		if not files:
+			raise ValueError('{0} has a cache but no input files to key it on; set input_files'.format(cls.__name__))
+		return fingerprint(cls.__module__, cls.__qualname__, [file_identity(path) for path in files], state, source_hash(cls.read_excMC), source_hash(cls.read_incMC))
+	def _cut_key(self, cut, inputs=None):
+		cls = type(self)
+		return fingerprint(self.cache_inputs() if inputs is None else inputs, cut, source_hash(cls.apply_cut), source_hash(cls.signal), source_hash(cls.background))
+	def figure(self, s, b):
+		return s / (s + b) ** 0.5
 	@abstractmethod
 	def read_excMC(self, *args, **kwargs):
 		pass
@@ -308,13 +937,13 @@ class FOM:
 	def save(self, json_name):
 		import json
 		with open(json_name or 'FOM.json', 'w') as f:
-			f.write(json.dumps([(float(i), val) for i, val in self.val], indent=4))
+			f.write(json.dumps([(_cut_json(i), val) for i, val in self.val], indent=4))
 	def plot(self, path=None, title=('', ''), if_pause=True, draw_line=True, line_x=None):
 		path = path or 'pic/FOM.eps'
 		c = root.TCanvas()
 		g = root.TGraph(len(self.val))
 		for i, t in enumerate(self.val):
-			g.SetPoint(i, float(t[0]), t[1])
+			g.SetPoint(i, _cut_x(t[0]), t[1])
 		g.SetTitle('')
 		g.GetXaxis().SetTitle(title[0])
 		g.GetYaxis().SetTitle(title[1])
@@ -323,32 +952,135 @@ class FOM:
 		g.Draw("ALP")
 		i, val = self.max
 		if draw_line:
-			line_x = line_x or float(i)
+			line_x = line_x or _cut_x(i)
 			RedLine().DrawLine(line_x, g.GetYaxis().GetXmax(), line_x, g.GetYaxis().GetXmin())
 		#RedArrow().DrawArrow(float(i), max(val * 0.5, 1.0), float(i), val * 0.8, 0.02, "|>")
 		c.SaveAs(path)
 		if if_pause:
 			from getpass import getpass
 			getpass('pause...')
-	def process(self, json_path=None, subplot_path=None, log=None):
+	def _process_cut(self, excMC, incMC, cut, subplot_path, log, plot=True):
+		log(f"Applying cut on exc MC... for cut={cut}")
+		exc_cut = self.apply_cut(excMC, cut)
+		s = self.signal(exc_cut)
+		if plot:
+			self.save_individual_plot(exc_cut, subplot_path.format(cut, 'exc'), True)
+		log(f"Applying cut on inc MC... for cut={cut}")
+		inc_cut = self.apply_cut(incMC, cut)
+		b = self.background(inc_cut)
+		if plot:
+			self.save_individual_plot(inc_cut, subplot_path.format(cut, 'inc'), False)
+		return s, b
+	def save_plots(self, cuts, excMC, incMC, subplot_path=None):
+		subplot_path = subplot_path or 'FOMsub_{0}_{1}.eps'
+		for cut in cuts:
+			self.save_individual_plot(self.apply_cut(excMC, cut), subplot_path.format(cut, 'exc'), True)
+			self.save_individual_plot(self.apply_cut(incMC, cut), subplot_path.format(cut, 'inc'), False)
+	def process(self, json_path=None, subplot_path=None, log=None, workers=None, defer_plots=False):
+		# workers=N sweeps the cuts in N forked processes sharing the MC read here.
+		# defer_plots=True makes the individual plots after the sweep for the best cut only,
+		# a sequence of cuts makes them for those cuts instead. Cuts found in the cache are
+		# not recomputed and not plotted during the sweep.
 		if log is None:
 			log = lambda *args, **kwargs: None
-		log("Reading exc MC...")
-		excMC = self.read_excMC()
-		log("Reading inc MC...")
-		incMC = self.read_incMC()
 		subplot_path = subplot_path or 'FOMsub_{0}_{1}.eps'
-		for cut in self.cutRange:
-			log(f"Applying cut on exc MC... for cut={cut}")
-			exc_cut = self.apply_cut(excMC, cut)
-			s = self.signal(exc_cut)
-			self.save_individual_plot(exc_cut, subplot_path.format(cut, 'exc'), True)
-			log(f"Applying cut on inc MC... for cut={cut}")
-			inc_cut = self.apply_cut(incMC, cut)
-			b = self.background(inc_cut)
-			self.save_individual_plot(inc_cut, subplot_path.format(cut, 'inc'), False)
-			self.val.append((cut, s / (s + b) ** 0.5))
+		plot = defer_plots is False
+		cuts = list(self.cutRange)
+		sb = [None] * len(cuts)
+		if self.cache is not None:
+			inputs = self.cache_inputs()
+			keys = [self._cut_key(cut, inputs) for cut in cuts]
+			sb = [self.cache.get(key) for key in keys]
+		todo = [j for j, x in enumerate(sb) if x is None]
+		excMC = incMC = None
+		if todo or not plot:
+			log("Reading exc MC...")
+			excMC = self.read_excMC()
+			log("Reading inc MC...")
+			incMC = self.read_incMC()
+		if todo and workers and workers > 1:
+			_fom_state.update(fom=self, excMC=excMC, incMC=incMC, subplot_path=subplot_path, log=log, plot=plot)
+			try:
+				with multiprocessing.get_context('fork').Pool(workers) as pool:
+					done = pool.map(_fom_worker, [cuts[j] for j in todo], len(todo) // (workers * 4) or 1)
+			finally:
+				_fom_state.clear()
+		else:
+			done = [self._process_cut(excMC, incMC, cuts[j], subplot_path, log, plot) for j in todo]
+		for j, x in zip(todo, done):
+			sb[j] = x
+			if self.cache is not None:
+				self.cache.put(keys[j], x)
+		self.val.extend((cut, self.figure(s, b)) for cut, (s, b) in zip(cuts, sb))
 		self.max = i, val = max(self.val, key=lambda x: x[1])
+		if not plot:
+			self.save_plots([i] if defer_plots is True else defer_plots, excMC, incMC, subplot_path)
+		if json_path is not None:
+			self.save(json_path)
+
+# per-process state of the parallel cut sweep, inherited through fork
+_fom_state = {}
+def _fom_worker(cut):
+	st = _fom_state
+	return st['fom']._process_cut(st['excMC'], st['incMC'], cut, st['subplot_path'], st['log'], st['plot'])
+
+def _cut_json(cut):
+	return [float(c) for c in cut] if isinstance(cut, tuple) else float(cut)
+def _cut_x(cut):
+	# windows are drawn at their centre
+	return sum(map(float, cut)) / len(cut) if isinstance(cut, tuple) else float(cut)
+
+class FOM_Threshold(FOM):
+	# FOM scan of a single threshold on one variable: side='upper' keeps x < cut, 'lower'
+	# keeps x > cut and 'window' keeps lo < x < hi for cuts given as (lo, hi). Signal and
+	# background are arrays or RooDataSets (read at column `var`), optionally weighted. Each
+	# sample is sorted once; every cut is then two searchsorted lookups into cumulative weights.
+	def __init__(self, cutRange, sig, bkg, var=None, side='upper', sig_weight=None, bkg_weight=None):
+		super(FOM_Threshold, self).__init__(cutRange)
+		if side not in ('upper', 'lower', 'window'):
+			raise ValueError(side)
+		self.sig = sig, sig_weight
+		self.bkg = bkg, bkg_weight
+		self.var = var if var is None or isinstance(var, str) else var.GetName()
+		self.side = side
+	def _sorted(self, data, weight):
+		x, w = data_arrays(data, self.var)
+		if weight is not None:
+			w = np.asarray(weight, dtype=float)
+		order = np.argsort(x, kind='stable')
+		return x[order], np.concatenate([[0.], np.cumsum(np.ones(len(x)) if w is None else w[order])])
+	def read_excMC(self):
+		return self._sorted(*self.sig)
+	def read_incMC(self):
+		return self._sorted(*self.bkg)
+	def passed(self, sample, cuts):
+		x, cum = sample
+		cuts = np.asarray(cuts, dtype=float)
+		if self.side == 'upper':
+			return cum[np.searchsorted(x, cuts, 'left')]
+		elif self.side == 'lower':
+			return cum[-1] - cum[np.searchsorted(x, cuts, 'right')]
+		return np.maximum(cum[np.searchsorted(x, cuts[:, 1], 'left')] - cum[np.searchsorted(x, cuts[:, 0], 'right')], 0.)
+	def apply_cut(self, dataset, cut):
+		return self.passed(dataset, [cut])[0]
+	def signal(self, excMC):
+		return excMC
+	def background(self, incMC):
+		return incMC
+	def process(self, json_path=None, subplot_path=None, log=None, **kwargs):
+		if log is None:
+			log = lambda *args, **kwargs: None
+		log("Sorting exc MC...")
+		excMC = self.read_excMC()
+		log("Sorting inc MC...")
+		incMC = self.read_incMC()
+		cuts = list(self.cutRange)
+		s = self.passed(excMC, cuts)
+		b = self.passed(incMC, cuts)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			fom = np.where(s + b > 0, self.figure(s, b), 0.)
+		self.val.extend(zip(cuts, fom.tolist()))
+		self.max = max(self.val, key=lambda x: x[1])
 		if json_path is not None:
 			self.save(json_path)
 
@@ -368,26 +1100,56 @@ class FOM:
 #	def save_individual_plot(self, dataset, path, *args, **kwargs):
 #		pass
 
-def getPull(h1, extended_pdf, nevent, X, rng, hname="pull", Print=None):
+def _hist_array(h):
+	# bin contents including under/overflow, as a NumPy view of the histogram's own buffer
+	n = h.GetNcells()
+	if h.InheritsFrom('TArrayF'):
+		dtype = np.float32
+	elif h.InheritsFrom('TArrayD'):
+		dtype = np.float64
+	else:
+		return np.array([h.GetBinContent(i) for i in range(n)], dtype=float)
+	return _buffer_array(h.GetArray(), dtype, n)
+def _buffer_array(buf, dtype, n):
+	try:
+		buf.reshape((n,))
+	except AttributeError:
+		pass
+	return np.frombuffer(buf, dtype, n)
+
+# model histograms from createHistogram, keyed by model, observable, binning and the model's
+# parameter values; getPull and getResidue scale them by the event count themselves
+_projection_cache = OrderedDict()
+_projection_cache_size = 64
+def _projection(extended_pdf, X, rng, hname):
+	params = extended_pdf.getParameters(root.RooArgSet(X.var))
+	key = id(extended_pdf), X.var.GetName(), tuple(rng), tuple((p.GetName(), p.getVal()) for p in params)
+	if key in _projection_cache:
+		_projection_cache.move_to_end(key)
+		return _projection_cache[key][1]
 	h2 = extended_pdf.createHistogram(hname + "0", X.var, root.RooFit.Binning(rng[0]), root.RooFit.Extended(True))
-	h2.Scale(nevent)
+	h2.SetDirectory(0)
+	_projection_cache[key] = register('projection', (extended_pdf, h2), _projection_cache)
+	while len(_projection_cache) > _projection_cache_size:
+		_projection_cache.popitem(last=False)
+	return h2
+
+def getPull(h1, extended_pdf, nevent, X, rng, hname="pull", Print=None):
+	nbin = rng[0]
+	n0 = _hist_array(h1)[1:nbin + 1].astype(float)
+	nfit = _hist_array(_projection(extended_pdf, X, rng, hname)).astype(float)[1:nbin + 1] * nevent
 	hpull = root.TH1F(hname, hname, *rng)
 	hpull.SetDirectory(0)
-	for i in range(1, rng[0] + 1):
-		n0 = h1.GetBinContent(i)
-		nfit = h2.GetBinContent(i)
-		if n0 > 0:
-			pull = (nfit - n0) * 1.0 / n0 ** 0.5
-			epull = (nfit * 1.0 / n0 + (1.0 + nfit * nfit) * 0.25 / n0 / n0) ** 0.5
-		elif nfit > 0:
-			pull = (nfit - n0) * 1.0 / nfit ** 0.5
-			epull = (0.25 + n0 * 1.0 / nfit + n0 * n0 * 0.25 / nfit / nfit) ** 0.5
-		else:
-			pull = epull = 0.0
-		if Print is not None:
-			Print((pull, epull))
-		hpull.SetBinContent(i, pull)
-		hpull.SetBinError(i, epull)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		pull = np.where(n0 > 0, (nfit - n0) / np.sqrt(n0), np.where(nfit > 0, (nfit - n0) / np.sqrt(nfit), 0.))
+		epull = np.where(n0 > 0, np.sqrt(nfit / n0 + (1.0 + nfit * nfit) * 0.25 / n0 / n0), np.where(nfit > 0, np.sqrt(0.25 + n0 / nfit + n0 * n0 * 0.25 / nfit / nfit), 0.))
+	if Print is not None:
+		for t in zip(pull.tolist(), epull.tolist()):
+			Print(t)
+	hpull.Sumw2()
+	_hist_array(hpull)[1:nbin + 1] = pull
+	_buffer_array(hpull.GetSumw2().GetArray(), np.float64, hpull.GetNcells())[1:nbin + 1] = epull ** 2
+	hpull.SetEntries(nbin)
 	
 	FormatData(hpull)
 	hpull.GetYaxis().SetTitle("Pull")
@@ -397,6 +1159,10 @@ def getPull(h1, extended_pdf, nevent, X, rng, hname="pull", Print=None):
 	hpull.GetXaxis().SetTitle("")
 	return hpull
 
+def getPulls(pairs, X, rng, hname="pull", Print=None):
+	# pull histograms for a batch of (data histogram, model, nevent)
+	return [getPull(h1, extended_pdf, nevent, X, rng, hname + str(k), Print) for k, (h1, extended_pdf, nevent) in enumerate(pairs)]
+
 def drawPullLine(xmin, xmax):
 	line = root.TLine(xmin, 0.0, xmax, 0.0)
 	line.Draw()
@@ -407,7 +1173,8 @@ def drawPullLine(xmin, xmax):
 	line.DrawLine(xmin, 3.0, xmax, 3.0)
 
 def getResidue(h1, extended_pdf, nevent, X, rng, hname="residue", Print=None, if_div=False):
-	h2 = extended_pdf.createHistogram(hname + "0", X.var, root.RooFit.Binning(rng[0]), root.RooFit.Extended(True))
+	h2 = _projection(extended_pdf, X, rng, hname).Clone(hname + "0")
+	h2.SetDirectory(0)
 	h2.Scale(nevent)
 	hpull = root.TH1F(hname, hname, *rng)
 	hpull.Sumw2(True)
@@ -425,3 +1192,6 @@ def getResidue(h1, extended_pdf, nevent, X, rng, hname="residue", Print=None, if
 	hpull.GetXaxis().SetTitle("")
 	return hpull
 
+def getResidues(pairs, X, rng, hname="residue", Print=None, if_div=False):
+	# residue histograms for a batch of (data histogram, model, nevent)
+	return [getResidue(h1, extended_pdf, nevent, X, rng, hname + str(k), Print, if_div) for k, (h1, extended_pdf, nevent) in enumerate(pairs)]
@@ -0,0 +1,151 @@
+import json
+import os
+import tempfile
+from ..ROOT import root
+from . import pdf as _pdf
+from .cache import fingerprint
+from .scope import register
+
+# Cache of built models in RooWorkspace files. load_or_build(spec, build) hashes `spec`, a
+# JSON-like description of how the model is constructed (pdf types, Var names, ranges and
+# initial values; describe() produces one from a built model), and either loads the model
+# stored under that hash or calls build() and stores what it returns. A stored model is a
+# <hash>.root file with the workspace and a <hash>.json file with the layout of the UGFlib
+# wrappers, which are re-created around the workspace objects on load. A stored model whose
+# variables no longer match the values and ranges in its layout is rebuilt.
+
+def describe(obj):
+	if isinstance(obj, _pdf.Add):
+		return {'class': 'Add', 'name': obj.pdf.GetName(), 'pair': [[var.GetName(), describe(pdf)] for var, pdf in obj.pair]}
+	node = {'class': type(obj).__name__, 'name': obj.pdf.GetName(), 'X': obj.X.GetName()}
+	if isinstance(obj, _pdf.Simu):
+		node.update(category=obj.slice_name, slices=list(obj.slice_names), pdfs=[describe(p) for p in obj.pdfs])
+	elif hasattr(obj, 'l'):
+		node['params'] = [v.GetName() for v in obj.l]
+	elif isinstance(obj, _pdf.Hist):
+		node['hist'] = obj.hist.GetName()
+	if hasattr(obj, 'dataset'):
+		node['dataset'] = obj.dataset.GetName()
+	elif isinstance(obj, (_pdf.Conv, _pdf.Prod)):
+		if not all(isinstance(p, _pdf.AllPdf) for p in obj.pdfs):
+			raise TypeError('cannot describe {0} {1} of bare RooFit pdfs'.format(type(obj).__name__, obj.pdf.GetName()))
+		node['pdfs'] = [describe(p) for p in obj.pdfs]
+		if isinstance(obj, _pdf.Conv):
+			node.update(bins=obj.bins, buffer=obj.buffer)
+	return node
+
+def describe_vars(model):
+	return {v.GetName(): [v.getVal(), v.getMin(), v.getMax(), bool(v.isConstant())] for v in model.getVariables() if v.InheritsFrom('RooRealVar')}
+
+def _check_vars(ws, stored):
+	for name, value in stored.items():
+		v = ws.var(name)
+		if not v or [v.getVal(), v.getMin(), v.getMax(), bool(v.isConstant())] != value:
+			raise ValueError('variable {0} of workspace {1} does not match its layout'.format(name, ws.GetName()))
+
+def _datasets(obj):
+	# the datasets of Keys and FastKeys, which RooFit does not keep with the pdf
+	if hasattr(obj, 'dataset'):
+		yield obj.dataset
+	for child in getattr(obj, 'pdfs', ()):
+		for data in _datasets(child):
+			yield data
+	for var, child in getattr(obj, 'pair', ()):
+		for data in _datasets(child):
+			yield data
+
+def _var(ws, name):
+	# the registered Var if it already wraps the workspace object; a Var of the same name
+	# belonging to another model is left alone and the loaded model gets its own wrapper
+	v = _pdf.Var.get(name)
+	if v is NotImplemented:
+		return _pdf.Var(ws.arg(name))
+	if v.var is ws.arg(name):
+		return v
+	v = object.__new__(_pdf.Var)
+	v.var = ws.arg(name)
+	v.name = name
+	return v
+
+def _rebind(node, ws):
+	cls = getattr(_pdf, node['class'])
+	obj = object.__new__(cls)
+	obj.pdf = ws.pdf(node['name'])
+	if cls is _pdf.Add:
+		obj.pair = [(_var(ws, var), _rebind(child, ws)) for var, child in node['pair']]
+		return obj
+	obj.X = ws.var(node['X'])
+	_pdf.Pdf._dct[node['name']] = obj
+	register('Pdf', obj, _pdf.Pdf._dct)
+	if cls is _pdf.Simu:
+		obj.name = node['name']
+		obj.slice_name = node['category']
+		obj.slice_names = tuple(node['slices'])
+		obj.category = ws.cat(node['category'])
+		obj.pdfs = tuple(_rebind(child, ws) for child in node['pdfs'])
+	elif 'params' in node:
+		obj.l = [_var(ws, name) for name in node['params']]
+	elif 'hist' in node:
+		# RooHistPdf imports its histogram as embedded data
+		obj.hist = ws.embeddedData(node['hist']) or ws.data(node['hist'])
+	if 'dataset' in node:
+		obj.dataset = ws.data(node['dataset'])
+	elif 'pdfs' in node:
+		obj.pdfs = tuple(_rebind(child, ws) for child in node['pdfs'])
+		if cls is _pdf.Conv:
+			obj.bins, obj.buffer = node['bins'], node['buffer']
+			obj.key = _pdf._conv_key(obj.X, obj.pdfs[0], obj.pdfs[1], obj.bins, obj.buffer)
+			_pdf.conv_cache[node['name']] = obj
+			register('Conv', obj, _pdf.conv_cache)
+	return obj
+
+class ModelCache(object):
+	def __init__(self, path='.ugf_models'):
+		self.path = path
+	def key(self, spec):
+		return fingerprint(spec)
+	def _files(self, key):
+		return os.path.join(self.path, key + '.root'), os.path.join(self.path, key + '.json')
+	def __contains__(self, spec):
+		return all(os.path.exists(f) for f in self._files(self.key(spec)))
+	def load_or_build(self, spec, build):
+		key = self.key(spec)
+		if all(os.path.exists(f) for f in self._files(key)):
+			try:
+				return self.load(key)
+			except ValueError:
+				# a stored model that does not match its layout is rebuilt and replaced
+				pass
+		model = build()
+		self.store(key, model)
+		return model
+	def store(self, key, model):
+		rootfile, layout = self._files(key)
+		os.makedirs(self.path, exist_ok=True)
+		ws = root.RooWorkspace('ugf_' + key[:16], 'ugf_' + key[:16])
+		ws.Import(model.pdf, root.RooFit.Silence())
+		for data in _datasets(model):
+			if not ws.data(data.GetName()):
+				ws.Import(data)
+		fd, tmp = tempfile.mkstemp(suffix='.root', dir=self.path)
+		os.close(fd)
+		ws.writeToFile(tmp)
+		os.replace(tmp, rootfile)
+		fd, tmp = tempfile.mkstemp(suffix='.json', dir=self.path)
+		with os.fdopen(fd, 'w') as f:
+			json.dump({'workspace': ws.GetName(), 'model': describe(model), 'vars': describe_vars(model.pdf)}, f)
+		os.replace(tmp, layout)
+	def load(self, key):
+		rootfile, layout = self._files(key)
+		with open(layout) as f:
+			desc = json.load(f)
+		tfile = root.TFile.Open(rootfile)
+		ws = tfile.Get(desc['workspace'])
+		_check_vars(ws, desc['vars'])
+		model = _rebind(desc['model'], ws)
+		for name in desc['vars']:
+			if _pdf.Var.get(name) is NotImplemented:
+				_pdf.Var(ws.arg(name))
+		# the workspace owns the model's objects; keep it and its file alive with the model
+		model.workspace = register('workspace', (tfile, ws))
+		return model
@@ -0,0 +1,163 @@
+import numpy as np
+
+# Native NLL minimization for models with a NumPy backend (see Pdf.compile). Putting a
+# NativeFit instance into the fitTo arguments of a Pdf or Add, e.g. FitArgs(1), routes the fit
+# here instead of RooFit; the result exposes minNll() and status() like a RooFitResult and the
+# fitted values are written back to the Vars, so likelihood() and significance() work unchanged.
+
+class NativeFit(object):
+	def __init__(self, tolerance=1e-4, maxiter=1000, hesse=True, chunk=2 ** 22):
+		self.tolerance = tolerance
+		self.maxiter = maxiter
+		self.hesse = hesse
+		self.chunk = chunk
+
+class NativeResult(object):
+	def __init__(self, nll, status, values, errors, ncall):
+		self.nll = nll
+		self.stat = status
+		self.values = values
+		self.errors = errors
+		self.ncall = ncall
+	def minNll(self):
+		return self.nll
+	def status(self):
+		return self.stat
+	def __repr__(self):
+		return 'NativeResult(minNll={0}, status={1}, values={2})'.format(self.nll, self.stat, self.values)
+
+def data_arrays(data, name):
+	# observable column and weights (None if unweighted) of an array, RooDataSet or RooDataHist
+	if isinstance(data, np.ndarray):
+		return data.astype(float), None
+	if hasattr(data, 'to_numpy') and not data.InheritsFrom('RooDataHist'):
+		arrays = data.to_numpy()
+		w = arrays.get(data.weightVar().GetName()) if data.isWeighted() else None
+		return np.asarray(arrays[name], dtype=float), w
+	n = data.numEntries()
+	x = np.empty(n)
+	w = np.empty(n)
+	for i in range(n):
+		x[i] = data.get(i).getRealValue(name)
+		w[i] = data.weight()
+	return x, (w if data.isWeighted() or data.InheritsFrom('RooDataHist') else None)
+
+class _NLL(object):
+	def __init__(self, graph, x, w, engine):
+		self.graph = graph
+		self.x = x
+		self.sumw = len(x) if w is None else w.sum()
+		self.w = w
+		self.engine = engine
+		self.base = graph.values()
+		self.names = [name for name, var in graph.bindings.items() if not var.isConstant()]
+		self.lo = np.array([graph.bindings[n].getMin() for n in self.names])
+		self.hi = np.array([graph.bindings[n].getMax() for n in self.names])
+		self.ncall = 0
+	def __call__(self, P):
+		# NLL at each row of P, shape (B, nfloat), evaluated in batches of bounded size
+		P = np.atleast_2d(P)
+		out = np.empty(len(P))
+		step = max(1, self.engine.chunk // max(len(self.x), 1))
+		for i in range(0, len(P), step):
+			values = dict(self.base)
+			values.update((n, P[i:i + step, j]) for j, n in enumerate(self.names))
+			dens = self.graph.density(self.x, values)
+			with np.errstate(divide='ignore', invalid='ignore'):
+				logf = np.log(dens)
+			logf = np.where(np.isfinite(logf), logf, -1e30)
+			nll = -(logf.sum(axis=-1) if self.w is None else logf @ self.w)
+			nu = self.graph.expected(values)
+			if nu is not None:
+				with np.errstate(divide='ignore', invalid='ignore'):
+					nll = nll + nu - self.sumw * np.log(nu)
+			out[i:i + step] = np.where(np.isfinite(nll), nll, np.inf)
+		self.ncall += len(P)
+		return out
+	def steps(self, p):
+		return 1e-5 * np.maximum(np.abs(p), 1e-3)
+	def gradient(self, p):
+		# value, central-difference gradient and diagonal curvature from one batch of 2k+1 points
+		h = self.steps(p)
+		E = np.diag(h)
+		f = self(np.vstack([p, p + E, p - E]))
+		k = len(p)
+		fp, fm = f[1:k + 1], f[k + 1:]
+		return f[0], (fp - fm) / (2 * h), (fp - 2 * f[0] + fm) / h ** 2
+	def hessian(self, p):
+		h = self.steps(p)
+		k = len(p)
+		pts = [p]
+		for i in range(k):
+			for j in range(i, k):
+				for si, sj in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+					q = p.copy()
+					q[i] += si * h[i]
+					q[j] += sj * h[j]
+					pts.append(q)
+		f = self(np.array(pts))
+		H = np.empty((k, k))
+		n = 1
+		for i in range(k):
+			for j in range(i, k):
+				fpp, fpm, fmp, fmm = f[n:n + 4]
+				H[i, j] = H[j, i] = (fpp - fpm - fmp + fmm) / (4 * h[i] * h[j])
+				n += 4
+		return H
+
+def fit(model, data, engine=None):
+	engine = engine or NativeFit()
+	graph = model if hasattr(model, 'density') else model.compile()
+	x, w = data_arrays(data, graph.observable)
+	nll = _NLL(graph, x, w, engine)
+	p = np.clip(np.array([nll.base[n] for n in nll.names], dtype=float), nll.lo, nll.hi)
+	status = 0
+	if nll.names:
+		f, g, d2 = nll.gradient(p)
+		Hinv = np.diag(1 / np.where(d2 > 0, d2, np.maximum(np.abs(d2), 1.)))
+		for it in range(engine.maxiter):
+			free = ~(((p <= nll.lo) & (g > 0)) | ((p >= nll.hi) & (g < 0)))
+			edm = 0.5 * g[free] @ Hinv[np.ix_(free, free)] @ g[free]
+			if edm < engine.tolerance * 1e-3:
+				break
+			d = -Hinv @ g
+			t = 1.
+			while True:
+				q = np.clip(p + t * d, nll.lo, nll.hi)
+				fq = nll(q)[0]
+				if fq <= f + 1e-4 * g @ (q - p) or t < 1e-10:
+					break
+				t *= 0.5
+			if fq > f:
+				status = 3
+				break
+			fq, gq, d2 = nll.gradient(q)
+			s, y = q - p, gq - g
+			sy = s @ y
+			if sy > 1e-12:
+				rho = 1 / sy
+				V = np.eye(len(p)) - rho * np.outer(s, y)
+				Hinv = V @ Hinv @ V.T + rho * np.outer(s, s)
+			p, f, g = q, fq, gq
+		else:
+			status = 1
+		errors = np.sqrt(np.abs(np.diag(Hinv)))
+		if engine.hesse:
+			try:
+				cov = np.linalg.inv(nll.hessian(p))
+				errors = np.sqrt(np.abs(np.diag(cov)))
+				if np.any(np.diag(cov) <= 0):
+					status = status or 4
+			except np.linalg.LinAlgError:
+				status = status or 4
+	else:
+		f = nll(p[None, :])[0]
+		errors = np.empty(0)
+	values = dict(zip(nll.names, p.tolist()))
+	errs = dict(zip(nll.names, errors.tolist()))
+	for n in nll.names:
+		var = graph.bindings[n]
+		var.setVal(values[n])
+		if hasattr(var, 'setError'):
+			var.setError(errs[n])
+	return NativeResult(float(f), status, values, errs, nll.ncall)
@@ -1,10 +1,30 @@
 import hashlib
+import multiprocessing
+import os
+import re
+import shutil
 import sys
+import tempfile
+import numpy as np
 from six import add_metaclass, string_types, integer_types
-import ROOT as root
-from ROOT import RooFit
+from ..ROOT import root
+from collections import OrderedDict
+from . import batch, function, native
+from .cache import fingerprint
+from .scope import register
 
-URooVarTypes = (root.RooRealVar, root.RooFormulaVar)
+class _LazyTypes(object): # {{{
+	# isinstance target resolving its ROOT classes on first use, so that importing does not load ROOT
+	def __init__(self, *names):
+		self.names = names
+		self.types = None
+	def __instancecheck__(self, obj):
+		if self.types is None:
+			self.types = tuple(getattr(root, name) for name in self.names)
+		return isinstance(obj, self.types)
+# }}}
+
+URooVarTypes = _LazyTypes('RooRealVar', 'RooFormulaVar')
 
 class _metavar(type): # {{{
 	def __getattr__(cls, var):
@@ -74,6 +94,7 @@ class Var(AutoNaming): # {{{
 			Var.Print(name_r)
 		self.name = name_r
 		Var._dct[name_r] = self
+		register('Var', self, Var._dct)
 	def __getattr__(self, name):
 		return self.var.__getattribute__(name)
 	def __float__(self):
@@ -90,8 +111,7 @@ class Var(AutoNaming): # {{{
 		return NotImplemented
 	def __rsub__(self, num):
 		if isinstance(num, (integer_types, float)):
-			name = self._gen_name()
-			return root.RooFormulaVar(name, name, "{0} - {1}".format(num, self.var.getTitle()), root.RooArgList(self.var))
+			return formula("{0} - {1}".format(num, self.var.getTitle()), [self]).var
 		else:
 			return NotImplemented
 	@classmethod
@@ -157,6 +177,7 @@ class VarList(object): # {{{
 		else:
 			self.list = root.RooArgList(*[_change(x).var for x in args])
 		VarList_cache.append(self)
+		register('VarList', self, VarList_cache)
 	def __getattr__(self, name):
 		return self.list.__getattribute__(name)
 	def __len__(self):
@@ -228,6 +249,27 @@ class VarFormula(Var): # {{{
 		super(VarFormula, self).__init__(root.RooFormulaVar(name, title, varlist))
 # }}}
 
+formula_cache = {}
+def formula(title, l): # {{{
+	# VarFormula shared by every use of the same expression over the same Vars
+	l = [_change(x) for x in l]
+	key = (title, tuple(x.name for x in l))
+	ret = formula_cache.get(key)
+	# a Var re-created under the same name is a different input
+	if ret is None or any(x.var is not y for x, y in zip(l, ret.inputs)):
+		ret = formula_cache[key] = VarFormula(title, l)
+		ret.inputs = [x.var for x in l]
+		register('formula', ret, formula_cache)
+	return ret
+# }}}
+
+def _fitTo(pdf, data, *args, **kwargs): # {{{
+	for arg in args:
+		if isinstance(arg, native.NativeFit):
+			return native.fit(pdf, data, arg)
+	return pdf.pdf.fitTo(data, *args, **kwargs)
+# }}}
+
 class AllPdf(object): # {{{
 	def __init__(self, pdf):
 		self.pdf = pdf
@@ -253,6 +295,7 @@ class Add(AutoNaming, AllPdf): # {{{
 				name = args[1]
 			else:
 				name = self._gen_name()
+			self.pair = list(args[0].pair)
 			var = [x[0].var for x in args[0].pair]
 			pdfs = [x[1].pdf for x in args[0].pair]
 			if 'Print' in Pdf.__dict__:
@@ -272,6 +315,10 @@ class Add(AutoNaming, AllPdf): # {{{
 		return self.pdf.__getattribute__(name)
 	def __getitem__(self, index):
 		return AddPdfItem(self, index)
+	def compile(self):
+		return batch.Sum([pdf.compile() for var, pdf in self.pair], [var for var, pdf in self.pair])
+	def fitTo(self, data, *args, **kwargs):
+		return _fitTo(self, data, *args, **kwargs)
 # }}}
 
 class AddPdfItem(object): # {{{
@@ -301,6 +348,7 @@ class Pdf(AllPdf): # {{{
 		if 'Print' in Pdf.__dict__:
 			Pdf.Print(name)
 		self._dct[name] = self
+		register('Pdf', self, self._dct)
 		super(Pdf, self).__init__(pdf)
 	def __getattr__(self, name):
 		return self.pdf.__getattribute__(name)
@@ -311,6 +359,10 @@ class Pdf(AllPdf): # {{{
 		if isinstance(other, Pdf):
 			return Prod(self, other)
 		raise NotImplemented
+	def compile(self):
+		raise NotImplementedError('no NumPy backend for ' + type(self).__name__)
+	def fitTo(self, data, *args, **kwargs):
+		return _fitTo(self, data, *args, **kwargs)
 # }}}
 
 def metapdf_withkw(typ_str, args_default): # {{{
@@ -318,6 +370,7 @@ def metapdf_withkw(typ_str, args_default): # {{{
 		def __new__(cls, name, bases, dct):
 			dct['typ_str'] = typ_str
 			dct['args_default'] = args_default
+			own_bases = bases
 			def __init__(self, X, *args, **kwargs):
 				args = list(args)
 				l = []
@@ -338,9 +391,10 @@ def metapdf_withkw(typ_str, args_default): # {{{
 					name = self._gen_name()
 				if len(args) != 0 or len(kwargs) != 0:
 					raise TypeError
-				for typ in bases:
+				for typ in own_bases:
 					typ.__init__(self)
 				Pdf.__init__(self, X, name, None)
+				self.l = l
 				if isinstance(self.typ_str, str):
 					self.pdf = root.__getattr__(self.typ_str)(name, name, self.X, *map(lambda x: x.var, l))
 				else:
@@ -356,13 +410,17 @@ def metapdf_withkw(typ_str, args_default): # {{{
 # }}}
 
 class Gaus(metaclass=metapdf_withkw('RooGaussian', ('mean', 'sigma'))):
-	pass
+	def compile(self):
+		return batch.Shape(function.gaussian, self.l, self.X)
 class Argus(metaclass=metapdf_withkw('RooArgusBG', ('m0', 'c', 'p'))):
-	pass
+	def compile(self):
+		return batch.Shape(function.argus, self.l, self.X)
 class Crys(metaclass=metapdf_withkw('RooCBShape', ('mean', 'sigma', 'asym', 'amp'))):
-	pass
+	def compile(self):
+		return batch.Shape(function.crystal_ball, self.l, self.X)
 class BW(metaclass=metapdf_withkw('RooBreitWigner', ('mean', 'sigma'))):
-	pass
+	def compile(self):
+		return batch.Shape(function.breit_wigner, self.l, self.X)
 
 dblgaus_cache = []
 def _build_dblgaus(self, name, X, varfrac, mean1, sigma1, mean2, sigma2):
@@ -373,9 +431,12 @@ def _build_dblgaus(self, name, X, varfrac, mean1, sigma1, mean2, sigma2):
 	list1 = root.RooArgList(gaus1, gaus2)
 	list2 = root.RooArgList(varfrac)
 	dblgaus_cache.extend([gaus1, gaus2, list1, list2])
+	for obj in (gaus1, gaus2, list1, list2):
+		register('dblgaus', obj, dblgaus_cache)
 	return root.RooAddPdf(name, name, list1, list2)
 class DblGaus(metaclass=metapdf_withkw(_build_dblgaus, ('frac', 'mean1', 'sigma1', 'mean2', 'sigma2'))):
-	pass
+	def compile(self):
+		return batch.Shape(function.double_gaussian, self.l, self.X, range=True, normalized=True)
 
 class Poly(AutoNaming, Pdf): # {{{
 	def __init__(self, X, *args, **kwargs):
@@ -395,6 +456,8 @@ class Poly(AutoNaming, Pdf): # {{{
 		self.l = l
 		super(Poly, self).__init__(X, name, None)
 		self.pdf = root.RooChebychev(name, name, self.X, root.RooArgList(*map(lambda x: x.var, l)))
+	def compile(self):
+		return batch.Shape(function.chebyshev, self.l, self.X, range=True)
 # }}}
 
 class Hist(AutoNaming, Pdf): # {{{
@@ -410,7 +473,7 @@ class Hist(AutoNaming, Pdf): # {{{
 			else:
 				self.pdf = root.RooHistPdf(name, name, root.RooArgSet(self.X), hist, intOrder)
 		else:
-			shift_var = VarFormula("@0-@1", root.RooArgList(X.var, shift.var))
+			shift_var = formula("@0-@1", [X, shift])
 			if intOrder is None:
 				self.pdf = root.RooHistPdf(name, name, VarList(shift_var).list, VarList(X).list, hist)
 			else:
@@ -430,24 +493,139 @@ class Keys(AutoNaming, Pdf): # {{{
 			self.pdf = root.RooKeysPdf(name, name, self.X, dataset, *keys_args)
 # }}}
 
+class FastKeys(Hist): # {{{
+	# Adaptive kernel estimate of a DataSet as a histogram pdf: the sample is binned on `bins`
+	# bins of X, smoothed with a pilot bandwidth as RooKeysPdf (times rho), and then smoothed
+	# again with per-bin bandwidths grouped into `classes` classes, one FFT per class; with
+	# mirror the sample is reflected at both ends of X. Binned samples and densities are
+	# kept by the hash of the sample, in memory and in `cache` (a DiskCache) if given, so a
+	# variant with other settings only redoes the smoothing.
+	def __init__(self, X, dataset, name=None, bins=1000, rho=1., mirror=True, classes=8, intOrder=1, cache=None):
+		self.dataset = dataset
+		x = X.var if isinstance(X, Var) else X
+		lo, hi = x.getMin(), x.getMax()
+		arrays = DataSet.to_arrays(dataset)
+		w = arrays[dataset.weightVar().GetName()] if dataset.isWeighted() else None
+		sample = fingerprint(arrays[x.GetName()], w)
+		key = fingerprint(sample, lo, hi, bins, rho, bool(mirror), classes)
+		density = _fastkeys_get(key, cache)
+		if density is None:
+			counts = _fastkeys_get(fingerprint(sample, lo, hi, bins), cache)
+			if counts is None:
+				counts = np.histogram(arrays[x.GetName()], bins, (lo, hi), weights=w)[0].astype(float)
+				_fastkeys_put(fingerprint(sample, lo, hi, bins), counts, cache)
+			density = _fastkeys_density(counts, (hi - lo) / bins, rho, mirror, classes)
+			_fastkeys_put(key, density, cache)
+		hist = DataHist.from_array([x], density, np.linspace(lo, hi, bins + 1))
+		super(FastKeys, self).__init__(X, hist, name, intOrder)
+# }}}
+
+fastkeys_cache = OrderedDict()
+fastkeys_cache_size = 32
+def _fastkeys_get(key, cache):
+	if key in fastkeys_cache:
+		fastkeys_cache.move_to_end(key)
+		return fastkeys_cache[key]
+	ret = cache.get(key) if cache is not None else None
+	if ret is not None:
+		_fastkeys_put(key, ret, None)
+	return ret
+def _fastkeys_put(key, value, cache):
+	fastkeys_cache[key] = value
+	while len(fastkeys_cache) > fastkeys_cache_size:
+		fastkeys_cache.popitem(False)
+	if cache is not None:
+		cache.put(key, value)
+
+def _fastkeys_density(counts, dx, rho, mirror, classes): # {{{
+	n = len(counts)
+	total = counts.sum()
+	if total <= 0:
+		raise ValueError('no events in the range of the observable')
+	pos = counts > 0
+	centers = dx * (np.arange(n) + 0.5)
+	mean = (counts * centers).sum() / total
+	sigma = np.sqrt((counts * (centers - mean) ** 2).sum() / total) or dx
+	h0 = (4. / 3.) ** 0.2 * sigma * total ** -0.2 * rho
+	t = dx * np.fft.fftfreq(3 * n, 1. / (3 * n))
+	def smooth(c, h):
+		# c on [lo, hi] convolved with a gaussian of width h, on the grid padded by n bins per side
+		padded = np.concatenate((c[::-1], c, c[::-1])) if mirror else np.concatenate((np.zeros(n), c, np.zeros(n)))
+		k = np.exp(-0.5 * (t / h) ** 2)
+		return np.fft.irfft(np.fft.rfft(padded) * np.fft.rfft(k / k.sum()), 3 * n)[n:2 * n]
+	pilot = np.maximum(smooth(counts, h0), total * 1e-12)
+	g = np.exp((counts[pos] * np.log(pilot[pos])).sum() / total)
+	h = h0 * np.sqrt(g / pilot)
+	# `classes` bandwidths evenly spaced in log h over the occupied bins; every bin is split
+	# between the two nearest ones, linearly in log h
+	logh = np.log(h)
+	levels = np.linspace(logh[pos].min(), logh[pos].max(), classes)
+	u = np.clip(np.interp(logh, levels, np.arange(classes)), 0, classes - 1) if classes > 1 else np.zeros(n)
+	k = np.minimum(u.astype(int), classes - 2) if classes > 1 else np.zeros(n, int)
+	f = u - k
+	density = np.zeros(n)
+	for c in range(classes):
+		part = np.where(k == c, counts * (1 - f), 0.) + np.where(k == c - 1, counts * f, 0.)
+		if part.any():
+			density += smooth(part, np.exp(levels[c]))
+	density = np.maximum(density, 0.)
+	return density / (density.sum() * dx)
+# }}}
+
 class Prod(AutoNaming, Pdf): # {{{
 	def __init__(self, X, pdf1, pdf2, name=None):
 		if name is None:
 			name = self._gen_name()
 		super(Prod, self).__init__(X, name, None)
+		self.pdfs = pdf1, pdf2
 		self.pdf = root.RooProdPdf(name, name, pdf1.pdf, pdf2.pdf)
 # }}}
 
+conv_cache = {}
+def _conv_key(X, pdf1, pdf2, bins, buffer):
+	return tuple(x.pdf if isinstance(x, AllPdf) else x for x in (pdf1, pdf2)), X.GetName(), bins, buffer
 class Conv(AutoNaming, Pdf): # {{{
-	def __init__(self, X, pdf1, pdf2, name=None):
+	# bins: FFT sampling of X, set as its 'cache' binning. That binning belongs to X, so all
+	# Convs of one X must ask for the same bins (or leave bins unset). buffer: the buffer
+	# fraction. An unnamed Conv of the same pdfs and settings as an existing one is that
+	# Conv, with its RooFFTConvPdf, FFT setup and caches.
+	def __new__(cls, X, pdf1, pdf2, name=None, bins=None, buffer=None):
 		if name is None:
-			name = self._gen_name()
+			key = _conv_key(X, pdf1, pdf2, bins, buffer)
+			for conv in conv_cache.values():
+				if conv.key[1:] == key[1:] and all(a is b for a, b in zip(conv.key[0], key[0])):
+					return conv
+		return super(Conv, cls).__new__(cls)
+	def __init__(self, X, pdf1, pdf2, name=None, bins=None, buffer=None):
+		if 'key' in self.__dict__:
+			# an existing Conv returned by __new__
+			return
+		if bins is not None:
+			for conv in conv_cache.values():
+				if conv.key[1] == X.GetName() and conv.bins is not None and conv.bins != bins:
+					raise ValueError('{0} already has {1} FFT bins for Conv {2}, not {3}'.format(conv.key[1], conv.bins, conv.pdf.GetName(), bins))
+		self.key = _conv_key(X, pdf1, pdf2, bins, buffer)
+		self.pdfs = pdf1, pdf2
+		self.bins = bins
+		self.buffer = buffer
 		if isinstance(pdf1, AllPdf):
 			pdf1 = pdf1.pdf
 		if isinstance(pdf2, AllPdf):
 			pdf2 = pdf2.pdf
+		if name is None:
+			name = self._gen_name()
 		super(Conv, self).__init__(X, name, None)
+		if bins is not None:
+			self.X.setBins(bins, 'cache')
 		self.pdf = root.RooFFTConvPdf(name, name, self.X, pdf1, pdf2)
+		if buffer is not None:
+			self.pdf.setBufferFraction(buffer)
+		conv_cache[name] = self
+		register('Conv', self, conv_cache)
+	def compile(self):
+		if not all(isinstance(pdf, AllPdf) for pdf in self.pdfs):
+			raise NotImplementedError('no NumPy backend for a Conv of bare RooFit pdfs')
+		return batch.Conv(self.pdfs[0].compile(), self.pdfs[1].compile(), self.pdfs[1].pdf.GetName(), self.bins or 1024, 0.1 if self.buffer is None else self.buffer)
 # }}}
 
 class DoubleGausAdded(AutoNaming, ExtendedPdf):
@@ -466,22 +644,68 @@ class Simu(AutoNaming, Pdf): # {{{
 			self.name = kwargs.pop('name')
 		else:
 			self.name = self._gen_name()
-		self.slice_names = AutoNaming._gen_names(length, self.name + '_')
+		if 'slice_names' in kwargs:
+			self.slice_names = tuple(kwargs.pop('slice_names'))
+			if len(self.slice_names) != length:
+				raise IndexError(self.slice_names)
+		else:
+			self.slice_names = AutoNaming._gen_names(length, self.name + '_')
 		self.slice_name = Slice._gen_name()
 		self.category = root.RooCategory(self.slice_name, self.slice_name)
 		for name in self.slice_names:
 			self.category.defineType(name)
 		super(Simu, self).__init__(X, self.name, None)
-		self.pdf = root.RooSimultaneous(self.name, self.name, self.category)
-		for name, pdf in zip(self.slice_names, args):
-			self.pdf.addPdf(pdf.pdf, name)
+		# all slices in one constructor call instead of one addPdf per slice
+		self.pdf = root.RooSimultaneous(self.name, self.name, _std_map('RooAbsPdf*', zip(self.slice_names, (pdf.pdf for pdf in args))), self.category)
 		if 'Print' in Pdf.__dict__:
 			Pdf.Print((self.name, self.slice_name, self.slice_names))
 		self.pdfs = args
-	def consDataArgs(self, *args):
+	def _import(self, args, policy):
+		# (binned, arguments) for a dataset of all slices
 		if len(args) != len(self.pdfs):
 			raise IndexError
-		return (root.RooFit.Index(self.category),) + tuple(root.RooFit.Import(name, data) for name, data in zip(self.slice_names, args))
+		# with a FitDataPolicy and more events than its threshold every slice is binned, and the
+		# arguments are for a RooDataHist instead of a RooDataSet
+		if policy is not None and sum(data.sumEntries() for data in args) > policy.threshold:
+			args = [policy.prepare(pdf, data, self.X, force=True) for pdf, data in zip(self.pdfs, args)]
+		binned = bool(args) and args[0].InheritsFrom('RooDataHist')
+		# one Import of a map, which is not bound by the limit of 8 RooCmdArgs of the
+		# constructors; every call's map is registered, so it lives as long as its arguments
+		imports = _std_map('RooDataHist*' if binned else 'RooDataSet*', zip(self.slice_names, args))
+		simu_import_cache.append(imports)
+		register('Import', imports, simu_import_cache)
+		return binned, (root.RooFit.Index(self.category), root.RooFit.Import(imports))
+	def consDataArgs(self, *args, policy=None):
+		return self._import(args, policy)[1]
+	def combine(self, *args, policy=None):
+		# one dataset of all slices, for fitting the Simu; policy as for consDataArgs
+		name = self.name + '_data'
+		binned, cons = self._import(args, policy)
+		if binned:
+			ret = root.RooDataHist(name, name, root.RooArgList(self.X), *cons)
+			datahist_cache.append(ret)
+			register('DataHist', ret, datahist_cache)
+		else:
+			ret = root.RooDataSet(name, name, args[0].get(), *cons)
+			dataset_cache.append(ret)
+			register('DataSet', ret, dataset_cache)
+		return ret
+	@classmethod
+	def from_mapping(cls, X, mapping, name=None):
+		# Simu of {slice name: pdf or (pdf, dataset)} in one step; returns it and the combined
+		# dataset (None without datasets)
+		items = [v if isinstance(v, tuple) else (v, None) for v in mapping.values()]
+		kwargs = {'slice_names': list(mapping)}
+		if name is not None:
+			kwargs['name'] = name
+		simu = cls(X, *[pdf for pdf, data in items], **kwargs)
+		if any(data is None for pdf, data in items):
+			return simu, None
+		return simu, simu.combine(*[data for pdf, data in items])
+	@staticmethod
+	def parallelArgs(n):
+		# fit arguments evaluating the NLL of the slices in n processes, one slice per process
+		return (root.RooFit.NumCPU(n, 2),)
 	def plotDataArgs(self, index):
 		return (root.RooFit.Cut("%s==%s::%s" % (self.slice_name, self.slice_name, self.slice_names[index])),)
 	def __getitem__(self, index):
@@ -491,6 +715,12 @@ class Simu(AutoNaming, Pdf): # {{{
 			name = index
 		return SimuItem(self, name)
 # }}}
+simu_import_cache = []
+def _std_map(typ, items):
+	ret = root.std.map('std::string', typ)()
+	for key, value in items:
+		ret[key] = value
+	return ret
 class SimuItem(object): # {{{
 	def __init__(self, simu, name):
 		self.simu = simu
@@ -519,25 +749,81 @@ class SimuAddPdfItem(object): # {{{
 
 _DataHist_temp = 0
 datahist_cache = []
-def DataHist(listvar, hist, name=None): # {{{
+def _datahist_name(name):
 	global _DataHist_temp
-	if isinstance(listvar, list):
-		arglist = root.RooArgList(*[(X if isinstance(X, URooVarTypes) else X.var) for X in listvar])
-	else:
-		arglist = root.RooArgSet(*[(X if isinstance(X, URooVarTypes) else X.var) for X in listvar])
 	if name is None:
 		name = 'datahist_' + str(_DataHist_temp)
 		_DataHist_temp += 1
 	if 'Print' in Var.__dict__:
 		Var.Print(name)
+	return name
+def DataHist(listvar, hist, name=None): # {{{
+	if isinstance(listvar, list):
+		arglist = root.RooArgList(*[(X if isinstance(X, URooVarTypes) else X.var) for X in listvar])
+	else:
+		arglist = root.RooArgSet(*[(X if isinstance(X, URooVarTypes) else X.var) for X in listvar])
+	name = _datahist_name(name)
 	ret = root.RooDataHist(name, name, arglist, hist)
 	datahist_cache.append(ret)
+	register('DataHist', ret, datahist_cache)
 	return ret
 # }}}
 
+def _datahist_from_array(listvar, counts, edges, name=None): # {{{
+	# DataHist of listvar from an array of bin contents, with edges[i] the bin edges of axis i
+	# (a single edge array for one axis); in one pass through a TH1D/TH2D/TH3D
+	counts = np.asarray(counts, dtype=np.float64)
+	if counts.ndim == 1 and np.ndim(edges[0]) == 0:
+		edges = [edges]
+	edges = [np.ascontiguousarray(e, dtype=np.float64) for e in edges]
+	if counts.shape != tuple(len(e) - 1 for e in edges) or not 1 <= counts.ndim <= 3:
+		raise ValueError('counts of shape {0} do not match {1} axes of edges'.format(counts.shape, len(edges)))
+	if hasattr(root.RooDataHist, 'from_numpy'):
+		# ROOT >= 6.28 fills the RooDataHist from the array directly
+		name = _datahist_name(name)
+		argset = root.RooArgSet(*[(X if isinstance(X, URooVarTypes) else X.var) for X in listvar])
+		ret = root.RooDataHist.from_numpy(counts, argset, bins=edges, name=name, title=name)
+		datahist_cache.append(ret)
+		register('DataHist', ret, datahist_cache)
+		return ret
+	args = ['datahist_array', 'datahist_array']
+	for e in edges:
+		args += [len(e) - 1, e]
+	h = getattr(root, 'TH{0}D'.format(counts.ndim))(*args)
+	h.SetDirectory(0)
+	# the histogram stores its cells with under/overflow and the first axis running fastest
+	cells = np.zeros([len(e) + 1 for e in reversed(edges)])
+	cells[(slice(1, -1),) * counts.ndim] = counts.T
+	h.SetContent(np.ascontiguousarray(cells).ravel())
+	h.SetEntries(counts.sum())
+	return DataHist(list(listvar), h, name)
+# }}}
+
+def _datahist_to_array(data): # {{{
+	# bin contents, shaped by axis, and the bin edges of every axis of a RooDataHist
+	obs = data.get()
+	binnings = [obs.at(i).getBinning() for i in range(obs.getSize())]
+	edges = [np.array([b.binLow(j) for j in range(b.numBins())] + [b.highBound()]) for b in binnings]
+	if hasattr(data, 'weightArray'):
+		# ROOT >= 6.24 exposes the bin weights as one buffer, in the same order
+		counts = np.frombuffer(data.weightArray(), dtype=np.float64, count=data.numEntries()).copy()
+	else:
+		counts = np.array([data.weight(i) for i in range(data.numEntries())], dtype=np.float64)
+	return counts.reshape([b.numBins() for b in binnings]), edges
+# }}}
+
+DataHist.from_array = _datahist_from_array
+DataHist.to_array = _datahist_to_array
+
 _DataSet_temp = 0
 dataset_cache = []
-def DataSet(listvar, tree, name=None): # {{{
+def DataSet(listvar, tree, name=None, cut=None, entries=None, chunk=None, workers=None, progress=None): # {{{
+	# Only the branches of listvar and those used in `cut` (a TTree selection) are read, and
+	# with `chunk` the tree is imported that many entries at a time, so memory follows the
+	# chunk size. `entries` is a count or a (first, last) range. `tree` may also be a list of
+	# TTrees or (file name, tree name) pairs, imported one after another or, with workers=N,
+	# by N forked processes, and merged. progress(done, total) is called after every chunk with
+	# entry counts for one tree, after every tree with tree counts for several.
 	global _DataSet_temp
 	argset = root.RooArgSet(*[(X if isinstance(X, URooVarTypes) else X.var) for X in listvar])
 	if name is None:
@@ -545,9 +831,197 @@ def DataSet(listvar, tree, name=None): # {{{
 		_DataSet_temp += 1
 	if 'Print' in Var.__dict__:
 		Var.Print(name)
-	ret = root.RooDataSet(name, name, tree, argset)
+	if not isinstance(tree, (list, tuple)):
+		ret = _import_tree(tree, argset, name, cut, entries, chunk, progress)
+	else:
+		sources = [_tree_source(t) for t in tree]
+		if workers and workers > 1 and len(sources) > 1 and all(isinstance(t, tuple) for t in sources):
+			parts = _import_parallel(sources, argset, cut, entries, chunk, workers)
+		else:
+			parts = (_import_source(t, argset, name, cut, entries, chunk) for t in sources)
+		ret = None
+		for i, part in enumerate(parts, 1):
+			if ret is None:
+				ret = part
+				ret.SetNameTitle(name, name)
+			else:
+				ret.append(part)
+			del part
+			if progress is not None:
+				progress(i, len(sources))
+		if ret is None:
+			ret = root.RooDataSet(name, name, argset)
 	dataset_cache.append(ret)
+	register('DataSet', ret, dataset_cache)
+	return ret
+# }}}
+
+def _tree_source(tree):
+	# (file name, tree name) of a tree that a worker can open again, or the tree itself
+	if isinstance(tree, (list, tuple)):
+		return tuple(tree)
+	f = tree.GetCurrentFile()
+	if f and not isinstance(tree, root.TChain):
+		return f.GetName(), tree.GetName()
+	return tree
+
+def _import_source(source, argset, name, cut, entries, chunk):
+	if not isinstance(source, tuple):
+		return _import_tree(source, argset, name, cut, entries, chunk)
+	f = root.TFile.Open(source[0])
+	try:
+		return _import_tree(f.Get(source[1]), argset, name, cut, entries, chunk)
+	finally:
+		f.Close()
+
+def _import_tree(tree, argset, name, cut=None, entries=None, chunk=None, progress=None): # {{{
+	branches = [x.GetName() for x in argset]
+	if cut:
+		branches += [w for w in set(re.findall(r'[A-Za-z_]\w*', cut)) if tree.GetBranch(w)]
+	n = tree.GetEntries()
+	if entries is None:
+		first, last = 0, n
+	elif isinstance(entries, integer_types):
+		first, last = 0, min(entries, n)
+	else:
+		first, last = entries[0], min(entries[1], n)
+	# without cut, range or chunking the tree is read directly, as it always was
+	direct = not cut and entries is None and chunk is None
+	chunk = chunk or max(last - first, 1)
+	ret = None
+	status = _branch_status(tree)
+	try:
+		tree.SetBranchStatus('*', 0)
+		for branch in branches:
+			tree.SetBranchStatus(branch, 1)
+		if direct:
+			ret = root.RooDataSet(name, name, tree, argset)
+			if progress is not None:
+				progress(n, n)
+			return ret
+		# the chunk trees are made in memory, not in the directory of the input file
+		context = root.TDirectory.TContext(root.gROOT)
+		try:
+			for start in range(first, last, chunk):
+				part = tree.CopyTree(cut or '', '', min(chunk, last - start), start)
+				root.SetOwnership(part, True)
+				if ret is None:
+					ret = root.RooDataSet(name, name, part, argset)
+				else:
+					data = root.RooDataSet(name + '_chunk', name, part, argset)
+					ret.append(data)
+					del data
+				del part
+				if progress is not None:
+					progress(min(start + chunk, last) - first, last - first)
+		finally:
+			# restores the current directory
+			del context
+	finally:
+		for branch, on in status:
+			tree.SetBranchStatus(branch, on)
+	if ret is None:
+		ret = root.RooDataSet(name, name, argset)
 	return ret
 # }}}
 
+def _branch_status(tree):
+	# (name, status) of every branch, parents before their sub-branches, so that setting them
+	# in this order restores each one exactly
+	ret = []
+	todo = list(tree.GetListOfBranches())
+	while todo:
+		branch = todo.pop(0)
+		ret.append((branch.GetName(), bool(tree.GetBranchStatus(branch.GetName()))))
+		todo.extend(branch.GetListOfBranches())
+	return ret
+
+# per-process state of the parallel DataSet import, inherited through fork
+_dataset_state = {}
+def _dataset_worker(i):
+	s = _dataset_state
+	data = _import_source(s['sources'][i], s['argset'], 'dataset_part', s['cut'], s['entries'], s['chunk'])
+	fd, path = tempfile.mkstemp(suffix='.root', dir=s['dir'])
+	os.close(fd)
+	f = root.TFile(path, 'RECREATE')
+	try:
+		data.Write('data')
+	finally:
+		f.Close()
+	return path
+
+def _import_parallel(sources, argset, cut, entries, chunk, workers):
+	# the parts are passed through files in one temporary directory, removed with whatever
+	# is left in it when the import ends, fails or is abandoned
+	tmpdir = tempfile.mkdtemp(prefix='ugf_dataset_')
+	_dataset_state.update(sources=sources, argset=argset, cut=cut, entries=entries, chunk=chunk, dir=tmpdir)
+	try:
+		with multiprocessing.get_context('fork').Pool(workers) as pool:
+			for path in pool.imap(_dataset_worker, range(len(sources))):
+				f = root.TFile.Open(path)
+				try:
+					yield root.RooDataSet(f.Get('data'), 'dataset_part')
+				finally:
+					f.Close()
+					os.remove(path)
+	finally:
+		_dataset_state.clear()
+		shutil.rmtree(tmpdir, ignore_errors=True)
+
+def _dataset_from_arrays(arrays, weights=None, name=None): # {{{
+	# DataSet from {Var or name: column}, through RooDataSet.from_numpy where ROOT has it and
+	# an RDataFrame snapshot otherwise; entries outside the Var ranges are dropped as for trees
+	global _DataSet_temp
+	listvar = [_change(X) for X in arrays]
+	columns = dict((X.GetName(), np.ascontiguousarray(a, dtype=np.float64)) for X, a in zip(listvar, arrays.values()))
+	if name is None:
+		name = 'dataset_' + str(_DataSet_temp)
+		_DataSet_temp += 1
+	argset = root.RooArgSet(*[X.var for X in listvar])
+	if weights is not None:
+		columns[name + '_weight'] = np.ascontiguousarray(weights, dtype=np.float64)
+	if hasattr(root.RooDataSet, 'from_numpy'):
+		ret = root.RooDataSet.from_numpy(columns, argset, name=name, title=name, weight_name=None if weights is None else name + '_weight')
+	else:
+		fd, path = tempfile.mkstemp(suffix='.root')
+		os.close(fd)
+		try:
+			root.RDF.MakeNumpyDataFrame(columns).Snapshot('data', path)
+			f = root.TFile.Open(path)
+			if weights is None:
+				ret = root.RooDataSet(name, name, f.Get('data'), argset)
+			else:
+				argset.add(root.RooRealVar(name + '_weight', name + '_weight', 1.))
+				ret = root.RooDataSet(name, name, f.Get('data'), argset, '', name + '_weight')
+			f.Close()
+		finally:
+			os.remove(path)
+	dataset_cache.append(ret)
+	register('DataSet', ret, dataset_cache)
+	return ret
+# }}}
+
+def _dataset_to_arrays(data): # {{{
+	# {name: column} of a RooDataSet, with the weights under the weight Var's name if weighted
+	if hasattr(data, 'to_numpy'):
+		return dict((k, np.asarray(v)) for k, v in data.to_numpy().items())
+	obs = data.get()
+	names = [obs.at(i).GetName() for i in range(obs.getSize())]
+	n = data.numEntries()
+	ret = dict((k, np.empty(n)) for k in names)
+	w = np.empty(n) if data.isWeighted() else None
+	for i in range(n):
+		row = data.get(i)
+		for k in names:
+			ret[k][i] = row.getRealValue(k)
+		if w is not None:
+			w[i] = data.weight()
+	if w is not None:
+		ret[data.weightVar().GetName()] = w
+	return ret
+# }}}
+
+DataSet.from_arrays = _dataset_from_arrays
+DataSet.to_arrays = _dataset_to_arrays
+
 # vim: fdm=marker
@@ -0,0 +1,62 @@
+import weakref
+from collections import Counter
+
+# Scopes for model building. Inside `with ModelScope() as scope:` every Var, Pdf, VarList,
+# DataSet, DataHist and helper object that UGFlib keeps in a module-level registry is also
+# recorded by the innermost scope; when the scope exits those registry entries are dropped,
+# so the objects (and the ROOT objects they own) are freed once the caller lets go of them
+# and their names can be used again. The scope itself only keeps weak references where the
+# object allows it; scope.live() counts, per kind, how many of its objects are still alive.
+
+class _Strong(object):
+	__slots__ = ('obj',)
+	def __init__(self, obj):
+		self.obj = obj
+	def __call__(self):
+		return self.obj
+
+def _ref(obj):
+	try:
+		return weakref.ref(obj)
+	except TypeError:
+		return _Strong(obj)
+
+class ModelScope(object):
+	_stack = []
+	def __init__(self, name=None):
+		self.name = name
+		self.objects = []
+	def __enter__(self):
+		ModelScope._stack.append(self)
+		return self
+	def __exit__(self, *exc):
+		ModelScope._stack.remove(self)
+		self.release()
+	def add(self, kind, obj, registry=None):
+		self.objects.append((kind, _ref(obj), registry))
+	def release(self):
+		drop = {}
+		for kind, ref, registry in self.objects:
+			obj = ref()
+			if obj is not None and registry is not None:
+				drop.setdefault(id(registry), (registry, set()))[1].add(id(obj))
+		for registry, ids in drop.values():
+			if isinstance(registry, dict):
+				for key in [key for key, value in registry.items() if id(value) in ids]:
+					del registry[key]
+			else:
+				registry[:] = [x for x in registry if id(x) not in ids]
+		# objects that cannot be weakly referenced are forgotten instead of kept alive
+		self.objects = [(kind, ref, None) for kind, ref, registry in self.objects if isinstance(ref, weakref.ref)]
+	def live(self):
+		return Counter(kind for kind, ref, registry in self.objects if ref() is not None)
+	def __len__(self):
+		return sum(self.live().values())
+	def __repr__(self):
+		return 'ModelScope({0!r}, live={1})'.format(self.name, dict(self.live()))
+
+def register(kind, obj, registry=None):
+	# records obj, kept in `registry` (a dict or list), with the innermost active scope
+	if ModelScope._stack:
+		ModelScope._stack[-1].add(kind, obj, registry)
+	return obj
@@ -0,0 +1,96 @@
+import json
+from six import string_types, integer_types
+from ..ROOT import root
+from . import pdf as _pdf
+
+# Models from a declarative spec, a JSON-serializable dict such as
+#	{'X': 'mbc',
+#	 'vars': {'mbc': [5.27, 5.2, 5.3], 'mean': [5.28, 5.27, 5.29], 'sigma': 0.003, 'nsig': [100, 0, 1e4], ...},
+#	 'pdfs': {'sig': {'type': 'Gaus', 'mean': 'mean', 'sigma': 'sigma'}},
+#	 'model': {'type': 'Simu', 'slices': [
+#		{'type': 'Add', 'components': [['nsig1', 'sig'], ['nbkg1', {'type': 'Argus', 'm0': 5.29, 'c': 'c', 'p': 0.5}]]},
+#		{'type': 'Add', 'components': [['nsig2', 'sig'], ['nbkg2', {'type': 'Poly', 'params': ['c1']}]]}]}}
+# Vars are [init, min, max], [min, max], a number for a constant, or a formula
+# {'formula': '@0*@1', 'vars': [...]}. A pdf node is a dict with 'type' (Gaus, Argus, Crys, BW,
+# DblGaus, Poly, Hist, Keys, Conv, Prod, Add or Simu) or the name of an entry of 'pdfs'; 'X'
+# defaults to that of the enclosing node. Identical nodes, formulas and constants are built
+# once and shared, e.g. a resolution Gaussian used in every category of a Simu. Histograms and
+# datasets for Hist and Keys are passed to build_model() in `data` and named in the spec.
+
+_meta = {'Gaus': _pdf.Gaus, 'Argus': _pdf.Argus, 'Crys': _pdf.Crys, 'BW': _pdf.BW, 'DblGaus': _pdf.DblGaus}
+
+class SpecBuilder(object):
+	def __init__(self, spec, data=None):
+		self.spec = spec
+		self.data = data or {}
+		self.vars = {}
+		self.consts = {}
+		self.nodes = {}
+		self.named = {}
+	def build(self):
+		for name, value in self.spec.get('vars', {}).items():
+			self.var(name)
+		return self.node(self.spec['model'], self.spec.get('X'))
+	def var(self, ref):
+		if isinstance(ref, dict):
+			return _pdf.formula(ref['formula'], [self.var(x) for x in ref['vars']])
+		if isinstance(ref, (integer_types, float)):
+			if ref not in self.consts:
+				self.consts[ref] = _pdf.Var(float(ref))
+			return self.consts[ref]
+		if ref not in self.vars:
+			value = self.spec.get('vars', {}).get(ref)
+			if value is None:
+				self.vars[ref] = _pdf._change(ref)
+			elif isinstance(value, dict):
+				self.vars[ref] = self.var(value)
+			elif isinstance(value, (integer_types, float)):
+				self.vars[ref] = _pdf.Var(ref, float(value))
+			else:
+				self.vars[ref] = _pdf.Var(ref, *map(float, value))
+		return self.vars[ref]
+	def node(self, node, X):
+		if isinstance(node, string_types):
+			if node not in self.named:
+				self.named[node] = self.node(self.spec['pdfs'][node], X)
+			return self.named[node]
+		X = node.get('X', X)
+		# unnamed nodes with the same content are one pdf
+		key = json.dumps([node, X], sort_keys=True)
+		if key not in self.nodes:
+			self.nodes[key] = self._build(node, X)
+		return self.nodes[key]
+	def _build(self, node, X):
+		typ = node['type']
+		kwargs = {'name': node['name']} if 'name' in node else {}
+		if typ == 'Add':
+			pair = [(self.var(y), self.node(child, X)) for y, child in node['components']]
+			return _pdf.Add(_pdf.ExtendedPdf(pair), *([node['name']] if 'name' in node else []))
+		if X is None:
+			raise ValueError('no observable for {0!r}'.format(node))
+		x = self.var(X)
+		if typ in _meta:
+			cls = _meta[typ]
+			return cls(x, *[self.var(node[s]) if s in node else _pdf.Var() for s in cls.args_default], **kwargs)
+		if typ == 'Poly':
+			return _pdf.Poly(x, *[self.var(p) for p in node.get('params', [])], **kwargs)
+		if typ == 'Hist':
+			hist = self.data[node['hist']]
+			if not isinstance(hist, root.RooDataHist):
+				hist = _pdf.DataHist([x], hist)
+			shift = self.var(node['shift']) if 'shift' in node else None
+			return _pdf.Hist(x, hist, intOrder=node.get('intOrder'), shift=shift, **kwargs)
+		if typ == 'Keys':
+			return _pdf.Keys(x, self.data[node['data']], **kwargs)
+		if typ in ('Conv', 'Prod'):
+			pdf1, pdf2 = [self.node(child, X) for child in node['pdfs']]
+			return getattr(_pdf, typ)(x, pdf1, pdf2, **kwargs)
+		if typ == 'Simu':
+			return _pdf.Simu(x, *[self.node(child, X) for child in node['slices']], **kwargs)
+		raise ValueError('unknown pdf type ' + typ)
+
+def build_model(spec, data=None, cache=None):
+	# the model described by spec; with a ModelCache, loaded from it when built before
+	if cache is not None and not data:
+		return cache.load_or_build(spec, lambda: SpecBuilder(spec).build())
+	return SpecBuilder(spec, data).build()
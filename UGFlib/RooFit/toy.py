@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import numpy as np
+from ..ROOT import root
+
+# Toy-MC studies: generate from a model, refit, and record per toy the fitted value, error
+# and pull of the studied Vars together with minNll and the fit status. Results go into one
+# structured NumPy array (a .npy memmap if `path` is given, so an interrupted study resumes
+# where it stopped); the toy datasets are released as soon as each fit is done. Toy i is
+# generated with a seed derived from (seed, i) only, so results do not depend on how the
+# toys are spread over workers.
+
+class ToyStudy(object):
+	def __init__(self, model, X, params, ntoys, nevents=None, seed=0, args=None, path=None):
+		self.model = model
+		self.obs = root.RooArgSet(*[x.var if hasattr(x, 'var') else x for x in (X if isinstance(X, (list, tuple)) else [X])])
+		self.params = list(params)
+		self.names = [p.GetName() for p in self.params]
+		self.truth = np.array([p.getVal() for p in self.params])
+		self.ntoys = ntoys
+		self.nevents = nevents
+		self.seed = seed
+		# the fit status and minNll come from the RooFitResult, so Save() is always passed
+		self.args = (root.RooFit.Extended(True), root.RooFit.PrintLevel(-1)) if args is None else tuple(args)
+		self.args += (root.RooFit.Save(),)
+		self.start = model.getParameters(self.obs)
+		self.snapshot = self.start.snapshot()
+		self.path = path
+		self.dtype = np.dtype([('toy', '<i8'), ('seed', '<u4'), ('done', '?'), ('status', '<i4'), ('minNll', '<f8'), ('nevents', '<f8')] + [(name + suffix, '<f8') for name in self.names for suffix in ('_val', '_err', '_pull')])
+		if path is not None and os.path.exists(path):
+			self.results = np.load(path, mmap_mode='r+')
+			if self.results.dtype != self.dtype or len(self.results) != ntoys:
+				raise ValueError('{0} holds a different study'.format(path))
+		elif path is not None:
+			self.results = np.lib.format.open_memmap(path, 'w+', self.dtype, (ntoys,))
+		else:
+			self.results = np.zeros(ntoys, self.dtype)
+	def toy_seed(self, i):
+		return int(np.random.SeedSequence([self.seed, i]).generate_state(1)[0])
+	def run_toy(self, i):
+		self.start.assignValueOnly(self.snapshot)
+		seed = self.toy_seed(i)
+		root.RooRandom.randomGenerator().SetSeed(seed)
+		if self.nevents is None:
+			data = self.model.generate(self.obs, root.RooFit.Extended(True))
+		else:
+			data = self.model.generate(self.obs, self.nevents)
+		root.SetOwnership(data, True)
+		res = self.model.fitTo(data, *self.args)
+		if isinstance(res, root.TObject):
+			root.SetOwnership(res, True)
+		row = [i, seed, True, res.status(), res.minNll(), data.sumEntries()]
+		for p, truth in zip(self.params, self.truth):
+			val, err = p.getVal(), p.getError()
+			row += [val, err, (val - truth) / err if err > 0 else np.nan]
+		del data, res
+		return tuple(row)
+	def run(self, workers=None, log=None, flush=50):
+		# fits the toys not done yet, in N forked processes with workers=N
+		todo = np.flatnonzero(~self.results['done']).tolist()
+		if workers and workers > 1 and len(todo) > 1:
+			_toy_state['study'] = self
+			try:
+				with multiprocessing.get_context('fork').Pool(workers) as pool:
+					self._store(pool.imap_unordered(_toy_worker, todo, len(todo) // (workers * 8) or 1), log, flush)
+			finally:
+				_toy_state.clear()
+		else:
+			self._store(map(self.run_toy, todo), log, flush)
+		self.start.assignValueOnly(self.snapshot)
+		return self.results
+	def _store(self, rows, log, flush):
+		for n, row in enumerate(rows, 1):
+			self.results[row[0]] = row
+			if log is not None:
+				log(row)
+			if n % flush == 0 and hasattr(self.results, 'flush'):
+				self.results.flush()
+		if hasattr(self.results, 'flush'):
+			self.results.flush()
+	@property
+	def done(self):
+		return self.results[self.results['done']]
+	def summary(self):
+		# mean and width of the pull of every studied Var over the converged toys
+		ok = self.done[self.done['status'] == 0]
+		return {name: (np.nanmean(ok[name + '_pull']), np.nanstd(ok[name + '_pull'])) for name in self.names}
+
+# per-process state of ToyStudy.run, inherited through fork
+_toy_state = {}
+def _toy_worker(i):
+	return _toy_state['study'].run_toy(i)
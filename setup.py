@@ -25,7 +25,8 @@ setuptools.setup(
 		"Topic :: Scientific/Engineering :: Physics"
 	],
 	install_requires=[
-		'six'
+		'six',
+		'numpy'
 	],
 	python_requires='>=2.7',
 )
@@ -0,0 +1,27 @@
+# Stand-ins for the few ROOT objects the NumPy code paths talk to
+
+class Real(object):
+	# the parts of a RooRealVar that compiled graphs and the native fit use
+	def __init__(self, name, val, lo=-1e7, hi=1e7, constant=False, cls='RooRealVar'):
+		self.name, self.val, self.lo, self.hi, self.constant, self.cls = name, val, lo, hi, constant, cls
+		self.error = 0.
+	def GetName(self):
+		return self.name
+	def getVal(self):
+		return self.val
+	def setVal(self, val):
+		self.val = val
+	def setError(self, error):
+		self.error = error
+	def getError(self):
+		return self.error
+	def getMin(self):
+		return self.lo
+	def getMax(self):
+		return self.hi
+	def isConstant(self):
+		return self.constant
+	def InheritsFrom(self, cls):
+		return cls == self.cls
+	def ClassName(self):
+		return self.cls
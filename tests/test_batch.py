@@ -0,0 +1,66 @@
+import pickle
+import numpy as np
+import pytest
+from UGFlib.RooFit import batch, function
+from doubles import Real
+
+X = Real('x', 0., -5., 5.)
+
+def gaus(mean, sigma):
+	return batch.Shape(function.gaussian, [Real(mean, 0.5), Real(sigma, 1.)], X)
+
+def integral(y, x):
+	return (np.trapz if hasattr(np, 'trapz') else np.trapezoid)(y, x)
+
+def test_shape_is_normalized_on_the_range():
+	x = np.linspace(-5., 5., 2001)
+	g = gaus('m', 's')
+	assert integral(g(x), x) == pytest.approx(1., abs=1e-6)
+	p = batch.Shape(function.chebyshev, [Real('c1', 0.3)], X, range=True)
+	assert integral(p(x), x) == pytest.approx(1., abs=1e-6)
+
+def test_batch_of_parameter_points():
+	g = gaus('m', 's')
+	x = np.linspace(-1., 1., 5)
+	y = g(x, {'m': np.array([0., 0.5, 1.]), 's': 1.})
+	assert y.shape == (3, 5)
+	assert np.allclose(y[1], g(x))
+
+def test_extended_sum():
+	a, b = gaus('m1', 's1'), gaus('m2', 's2')
+	s = batch.Sum([a, b], [Real('na', 30.), Real('nb', 10.)])
+	x = np.linspace(-2., 2., 7)
+	assert np.allclose(s(x), 0.75 * a(x) + 0.25 * b(x))
+	assert s.expected() == 40.
+	assert set(s.params) == {'na', 'nb', 'm1', 's1', 'm2', 's2'}
+
+def test_pickled_graph_needs_explicit_values():
+	g = pickle.loads(pickle.dumps(gaus('m', 's')))
+	with pytest.raises(ValueError):
+		g(np.zeros(3))
+	assert np.allclose(g(np.zeros(3), {'m': 0.5, 's': 1.}), gaus('m', 's')(np.zeros(3)))
+
+def test_conv_of_gaussians():
+	physics = batch.Shape(function.gaussian, [Real('m', 0.), Real('s', 1.)], X)
+	resolution = batch.Shape(function.gaussian, [Real('rm', 0.), Real('rs', 0.5)], X)
+	conv = batch.Conv(physics, resolution, 'res', bins=2048, buffer=0.2)
+	x = np.linspace(-3., 3., 61)
+	s = 1.25 ** 0.5
+	assert np.allclose(conv(x), np.exp(-0.5 * (x / s) ** 2) / (s * (2 * np.pi) ** 0.5), rtol=1e-3, atol=1e-5)
+	grid = np.linspace(-5., 5., 4001)
+	assert integral(conv(grid), grid) == pytest.approx(1., abs=1e-3)
+	y = conv(x, {'m': np.array([0., 1.]), 's': 1., 'rm': 0., 'rs': 0.5})
+	assert y.shape == (2, 61) and np.allclose(y[0], conv(x))
+	with pytest.raises(NotImplementedError):
+		batch.Conv(physics, conv, 'conv')
+
+def test_conv_kernels_are_shared():
+	batch._kernel_cache.clear()
+	resolution = batch.Shape(function.gaussian, [Real('rm', 0.), Real('rs', 0.5)], X)
+	a = batch.Conv(batch.Shape(function.gaussian, [Real('m', 0.), Real('s', 1.)], X), resolution, 'res')
+	b = batch.Conv(batch.Shape(function.breit_wigner, [Real('m', 0.), Real('w', 1.)], X), resolution, 'res')
+	a(np.zeros(3))
+	b(np.zeros(3))
+	assert len(batch._kernel_cache) == 1
+	a(np.zeros(3), {'m': 0., 's': 1., 'rm': 0., 'rs': 0.6})
+	assert len(batch._kernel_cache) == 2
@@ -0,0 +1,66 @@
+import os
+import numpy as np
+import pytest
+from UGFlib.RooFit.cache import DiskCache, cached, fingerprint, file_identity
+
+def test_fingerprint():
+	assert fingerprint(1, 'a', [2.5]) == fingerprint(1, 'a', [2.5])
+	assert fingerprint(1) != fingerprint(1.) != fingerprint('1')
+	assert fingerprint(np.int64(3), np.float32(0.5)) == fingerprint(3, 0.5)
+	assert fingerprint({'b': 1, 'a': 2}) == fingerprint({'a': 2, 'b': 1})
+	assert fingerprint(np.arange(3)) != fingerprint(np.arange(3.))
+	with pytest.raises(TypeError):
+		fingerprint(object())
+
+def test_file_identity_follows_the_file(tmp_path):
+	path = tmp_path / 'input.root'
+	path.write_bytes(b'a')
+	before = file_identity(str(path))
+	path.write_bytes(b'ab')
+	assert file_identity(str(path)) != before
+
+def test_disk_cache(tmp_path):
+	cache = DiskCache(str(tmp_path), max_size=10 ** 6)
+	key = fingerprint('x')
+	assert key not in cache and cache.get(key, 'missing') == 'missing'
+	cache.put(key, {'s': 1.5})
+	assert key in cache and cache.get(key) == {'s': 1.5}
+	cache.clear()
+	assert cache.size() == 0
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+	cache = DiskCache(str(tmp_path), max_size=3500)
+	keys = [fingerprint(i) for i in range(4)]
+	for i, key in enumerate(keys[:3]):
+		cache.put(key, b'x' * 1000)
+		os.utime(cache._file(key), (1000 + i, 1000 + i))
+	# reading the oldest entry makes it the most recently used
+	cache.get(keys[0])
+	cache.put(keys[3], b'x' * 1000)
+	assert keys[0] in cache and keys[1] not in cache and keys[2] in cache and keys[3] in cache
+	assert cache.size() <= 3500
+
+class Reader(object):
+	def __init__(self, cache, scale):
+		self.cache = cache
+		self.scale = scale
+		self.calls = 0
+	def cache_inputs(self):
+		return self.scale
+	@cached
+	def read(self, n):
+		self.calls += 1
+		return np.arange(n) * self.scale
+	@cached
+	def total(self, data):
+		self.calls += 1
+		return float(data.sum())
+
+def test_cached_methods(tmp_path):
+	cache = DiskCache(str(tmp_path))
+	first = Reader(cache, 2)
+	assert first.total(first.read(4)) == 12.
+	again = Reader(cache, 2)
+	assert again.total(again.read(4)) == 12. and again.calls == 0
+	other = Reader(cache, 3)
+	assert other.total(other.read(4)) == 18. and other.calls == 2
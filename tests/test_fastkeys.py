@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from UGFlib.RooFit.pdf import _fastkeys_density
+
+edges = np.linspace(-4., 4., 801)
+dx = edges[1] - edges[0]
+centers = 0.5 * (edges[1:] + edges[:-1])
+
+def test_density_of_a_gaussian_sample():
+	sample = np.random.default_rng(4).normal(0., 1., 200000)
+	counts = np.histogram(sample, edges)[0].astype(float)
+	truth = np.exp(-0.5 * centers ** 2) / (2 * np.pi) ** 0.5
+	for classes in (1, 8):
+		density = _fastkeys_density(counts, dx, 1., True, classes)
+		assert density.sum() * dx == pytest.approx(1.)
+		assert np.all(density >= 0)
+		assert np.abs(density - truth).max() < 0.01
+
+def test_mirror_keeps_mass_at_the_edges():
+	# an exponential piled up against the lower edge
+	sample = -4. + np.random.default_rng(5).exponential(1., 100000)
+	counts = np.histogram(sample, edges)[0].astype(float)
+	mirrored = _fastkeys_density(counts, dx, 1., True, 8)
+	open_edge = _fastkeys_density(counts, dx, 1., False, 8)
+	assert mirrored[0] == pytest.approx(1., rel=0.1)
+	assert open_edge[0] < 0.8 * mirrored[0]
+
+def test_empty_sample_is_refused():
+	with pytest.raises(ValueError):
+		_fastkeys_density(np.zeros(10), 0.1, 1., True, 8)
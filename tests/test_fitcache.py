@@ -0,0 +1,89 @@
+import numpy as np
+from UGFlib.RooFit.cache import DiskCache
+from UGFlib.RooFit.helper import FitCache, _fit
+from UGFlib.RooFit.native import NativeFit
+from doubles import Real
+
+class Data(object):
+	def __init__(self, x):
+		self.x = np.asarray(x, dtype=float)
+	def InheritsFrom(self, cls):
+		return cls in ('RooAbsData', 'RooDataSet')
+	def ClassName(self):
+		return 'RooDataSet'
+	def get(self):
+		return [Real('x', 0.)]
+	def to_numpy(self):
+		return {'x': self.x}
+
+class Node(object):
+	def ClassName(self):
+		return 'RooGaussian'
+	def GetName(self):
+		return 'gaus'
+	def GetTitle(self):
+		return 'gaus'
+
+class Result(object):
+	def __init__(self, nll):
+		self.nll = nll
+	def minNll(self):
+		return self.nll
+	def status(self):
+		return 0
+
+class Model(object):
+	# "fits" the mean of the data
+	def __init__(self):
+		self.mean = Real('mean', 0., -10., 10.)
+		self.pdf = self
+		self.fits = 0
+	def getComponents(self):
+		return [Node()]
+	def getParameters(self, data):
+		return [self.mean]
+	def fitTo(self, data, *args):
+		self.fits += 1
+		self.mean.setVal(float(data.x.mean()))
+		self.mean.setError(0.1)
+		return Result(-float(len(data.x)))
+
+def test_repeated_fit_is_served_from_the_cache():
+	model, cache = Model(), FitCache()
+	first = _fit(model, Data([1., 2., 3.]), (cache,))
+	model.mean.setVal(0.)
+	# another dataset object of the same content
+	again = _fit(model, Data([1., 2., 3.]), (cache,))
+	assert model.fits == 1 and cache.hits == 1
+	assert again.minNll() == first.minNll() == -3.
+	assert model.mean.getVal() == 2. and model.mean.getError() == 0.1
+
+def test_inputs_that_change_the_fit_miss():
+	model, cache = Model(), FitCache()
+	data = Data([1., 2., 3.])
+	cache.fit(model, data, ())
+	model.mean.setVal(0.)
+	cache.fit(model, Data([1., 2., 4.]), ())
+	model.mean.setVal(1.)
+	cache.fit(model, data, ())
+	model.mean.setVal(0.)
+	cache.fit(model, data, (NativeFit(tolerance=1e-6),))
+	assert model.fits == 4 and cache.hits == 0
+
+def test_disk_cache_outlives_the_memory(tmp_path):
+	disk = DiskCache(str(tmp_path))
+	model = Model()
+	FitCache(disk=disk).fit(model, Data([1., 3.]), ())
+	model.mean.setVal(0.)
+	cache = FitCache(size=1, disk=disk)
+	cache.fit(model, Data([1., 3.]), ())
+	assert model.fits == 1 and cache.hits == 1
+
+def test_dataset_hashes_are_bounded():
+	model, cache = Model(), FitCache(size=2)
+	data = [Data([float(i)]) for i in range(4)]
+	for d in data:
+		model.mean.setVal(0.)
+		cache.fit(model, d, ())
+	assert len(cache.data_keys) == 2 and len(cache.memory) == 2
+	assert list(cache.data_keys) == [id(data[2]), id(data[3])]
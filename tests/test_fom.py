@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from UGFlib.RooFit.cache import DiskCache
+from UGFlib.RooFit.helper import FOM, FOM_Threshold
+
+rng = np.random.default_rng(3)
+SIG = rng.normal(1., 0.5, 2000)
+BKG = rng.uniform(-2., 4., 5000)
+CUTS = np.linspace(-1., 3., 41).tolist()
+
+class ArrayFOM(FOM):
+	# keeps x < cut of two arrays; `reads` counts the MC reads
+	_uncached_attrs = FOM._uncached_attrs + ('reads',)
+	def __init__(self, cutRange, cache=None):
+		super(ArrayFOM, self).__init__(cutRange, cache)
+		self.reads = 0
+	def read_excMC(self):
+		self.reads += 1
+		return SIG
+	def read_incMC(self):
+		self.reads += 1
+		return BKG
+	def apply_cut(self, dataset, cut):
+		return dataset[dataset < cut]
+	def signal(self, excMC):
+		return float(len(excMC))
+	def background(self, incMC):
+		return float(len(incMC))
+
+def figures(cuts):
+	return [np.sum(SIG < c) / np.sqrt(np.sum(SIG < c) + np.sum(BKG < c)) for c in cuts]
+
+def test_process_in_workers_matches_serial():
+	serial, parallel = ArrayFOM(CUTS), ArrayFOM(CUTS)
+	serial.process()
+	parallel.process(workers=3)
+	assert parallel.val == serial.val
+	assert [v for c, v in serial.val] == pytest.approx(figures(CUTS))
+	assert serial.max == max(serial.val, key=lambda x: x[1])
+
+def test_threshold_matches_per_cut_counts():
+	fom = FOM_Threshold(CUTS, SIG, BKG)
+	fom.process()
+	assert [v for c, v in fom.val] == pytest.approx(figures(CUTS))
+	lower = FOM_Threshold(CUTS, SIG, BKG, side='lower')
+	lower.process()
+	s = np.array([np.sum(SIG > c) for c in CUTS])
+	b = np.array([np.sum(BKG > c) for c in CUTS])
+	assert [v for c, v in lower.val] == pytest.approx(s / np.sqrt(s + b))
+
+def test_threshold_windows_and_weights():
+	windows = [(lo, lo + 1.) for lo in CUTS]
+	w = rng.uniform(0.5, 1.5, len(SIG))
+	fom = FOM_Threshold(windows, SIG, BKG, side='window', sig_weight=w)
+	fom.process()
+	s = np.array([w[(SIG > lo) & (SIG < hi)].sum() for lo, hi in windows])
+	b = np.array([np.sum((BKG > lo) & (BKG < hi)) for lo, hi in windows])
+	assert [v for c, v in fom.val] == pytest.approx(s / np.sqrt(s + b))
+	with pytest.raises(ValueError):
+		FOM_Threshold(CUTS, SIG, BKG, side='both')
+
+def test_cached_sweep_skips_known_cuts(tmp_path):
+	cache = DiskCache(str(tmp_path / 'cache'))
+	source = tmp_path / 'mc.root'
+	source.write_bytes(b'mc')
+	first = ArrayFOM(CUTS, cache)
+	first.source = str(source)
+	first.process()
+	again = ArrayFOM(CUTS, cache)
+	again.source = str(source)
+	again.process()
+	assert again.reads == 0 and again.val == first.val
+	# another attribute value, or a changed input file, is another key
+	other = ArrayFOM(CUTS, cache)
+	other.source = str(source)
+	other.scale = np.float64(2.)
+	other.process()
+	assert other.reads == 2
+	source.write_bytes(b'new mc')
+	changed = ArrayFOM(CUTS, cache)
+	changed.source = str(source)
+	changed.process()
+	assert changed.reads == 2
+
+def test_cache_needs_input_files(tmp_path):
+	with pytest.raises(ValueError):
+		ArrayFOM(CUTS, DiskCache(str(tmp_path))).process()
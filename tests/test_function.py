@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from UGFlib.RooFit import function
+
+x = np.linspace(-2., 4., 601)
+
+def integral(y, x):
+	return np.trapz(y, x) if hasattr(np, 'trapz') else np.trapezoid(y, x)
+
+def test_batches_have_leading_axis():
+	batch = np.array([[0., 1.], [1., 0.5], [2., 2.]])
+	y = function.gaussian(x, batch)
+	assert y.shape == (3,) + x.shape
+	for row, p in zip(y, batch):
+		assert np.allclose(row, function.gaussian(x, p))
+	assert function.gaussian(x[:600].reshape(3, -1), batch[0]).shape == (3, 200)
+	with pytest.raises(ValueError):
+		function.gaussian(x, [0., 1., 2.])
+
+def test_crystal_ball_matches_scalar_version():
+	cb = function.Crystal_ball()
+	for mean, sigma, alpha, n in [(1., 0.5, 1.2, 3.), (0.5, 0.3, -0.8, 2.)]:
+		expected = [cb([v], (1., alpha, sigma, n, mean)) for v in x]
+		assert np.allclose(function.crystal_ball(x, [mean, sigma, alpha, n]), expected)
+
+def test_shapes():
+	assert np.allclose(function.breit_wigner(x, [1., 0.5]).max(), 1. / 0.0625)
+	a = function.argus(x, [3., -2., 0.5])
+	assert np.all(a[x >= 3.] == 0.) and np.all(a[(x > 0) & (x < 3)] > 0)
+	c = [0.3, -0.2, 0.1]
+	t = (2 * x - 2.) / 6.
+	assert np.allclose(function.chebyshev(x, c, -2., 4.), 1 + c[0] * t + c[1] * (2 * t ** 2 - 1) + c[2] * (4 * t ** 3 - 3 * t))
+
+def test_double_gaussian_is_normalized_on_the_range():
+	for p in ([0.3, 0., 0.5, 1., 2.], [0.8, 3.5, 1., -1., 0.3]):
+		assert integral(function.double_gaussian(x, p, -2., 4.), x) == pytest.approx(1., abs=1e-4)
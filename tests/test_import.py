@@ -0,0 +1,7 @@
+import os
+import subprocess
+import sys
+
+def test_importing_does_not_load_root():
+	code = 'import sys, UGFlib.RooFit, UGFlib.RooFit.helper, UGFlib.RooFit.toy; assert "ROOT" not in sys.modules'
+	subprocess.check_call([sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
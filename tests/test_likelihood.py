@@ -0,0 +1,99 @@
+import decimal
+import io
+import math
+import numpy as np
+from UGFlib.RooFit.helper import _Likelihood, decimal_range
+
+def gaussian_scan(mean=8., sigma=3., step='0.1', stop=40):
+	l = _Likelihood()
+	for n in decimal_range(0, stop, step):
+		l[n] = math.exp(-0.5 * ((float(n) - mean) / sigma) ** 2), 0.5 * ((float(n) - mean) / sigma) ** 2
+	return l
+
+def upper_limit(l, CL):
+	# the plain cumulative loop the array version replaced
+	total = sum(val for n, val, nll in l)
+	p = 0
+	for item in l:
+		p += item.val
+		if p >= CL * total:
+			return item
+
+def test_insertion_keeps_keys_sorted():
+	l = _Likelihood()
+	for n in ['2', '0', '1.5', '0.5', '3']:
+		l[decimal.Decimal(n)] = float(n), -float(n)
+	l[decimal.Decimal('1.5')] = 7., 8.
+	assert l.keys == [decimal.Decimal(n) for n in ['0', '0.5', '1.5', '2', '3']]
+	assert l.n.tolist() == [0., 0.5, 1.5, 2., 3.]
+	assert l.val.tolist() == [0., 0.5, 7., 2., 3.]
+	assert l.nll.tolist() == [0., -0.5, 8., -2., -3.]
+	assert l[decimal.Decimal('2')] == (2., -2.)
+	assert len(l) == 5
+
+def test_upper_limit():
+	l = gaussian_scan()
+	for CL in (0.5, 0.9, 0.95):
+		assert l.upper_limit(CL) == upper_limit(l, CL)
+	assert l.upper_limit([0.5, 0.9]) == [upper_limit(l, 0.5), upper_limit(l, 0.9)]
+
+def test_text_round_trip():
+	l = gaussian_scan(step='0.5', stop=10)
+	f = io.StringIO()
+	l.save(f)
+	loaded = _Likelihood.load_str(f.getvalue())
+	assert loaded.keys == l.keys
+	assert np.allclose(loaded.val, l.val) and np.allclose(loaded.nll, l.nll)
+
+def smeared(l, err, trunc=7):
+	# the double loop the kernel matrix replaced
+	step = float(l.keys[1] - l.keys[0])
+	out = []
+	for x, y, nll in l:
+		out.append(sum(y2 * math.exp(-float(x2 - x) ** 2 / (2 * (err * float(x2)) ** 2)) / (math.sqrt(2 * math.pi) * err * float(x2)) * step for x2, y2, nll2 in l if x2 != 0 and x != 0))
+	d = (out[trunc + 1] - out[trunc]) / step
+	for i in range(trunc):
+		out[i] = out[trunc] - (trunc - i) * d
+	return out
+
+def test_conv_matches_direct_sum():
+	l = gaussian_scan(step='0.25', stop=20)
+	expected = smeared(l, 0.1)
+	assert np.allclose(l.conv(0.1).val, expected, rtol=1e-10, atol=1e-12)
+	# small chunks give the same sums
+	assert np.allclose(l.conv(0.1, chunk=7).val, expected, rtol=1e-10, atol=1e-12)
+
+def test_conv_cut_off_and_several_widths():
+	l = gaussian_scan(step='0.25', stop=20)
+	assert np.allclose(l.conv(0.1, nsigma=8).val, l.conv(0.1).val, rtol=1e-9, atol=1e-12)
+	many = l.conv([0.05, 0.2])
+	assert np.allclose(many[0].val, l.conv(0.05).val)
+	assert np.allclose(many[1].val, l.conv(0.2).val)
+
+def test_catalogue_round_trip(tmp_path):
+	path = str(tmp_path / 'scans.ugfl')
+	a = gaussian_scan(step='0.5', stop=10)
+	b = gaussian_scan(mean=3., step='0.25', stop=5)
+	a.dump(path, 'a')
+	_Likelihood.dump_all(path, {'b': b, 'empty': _Likelihood()})
+	cat = _Likelihood.load_binary(path)
+	assert sorted(cat) == ['a', 'b', 'empty'] and len(cat) == 3
+	for name, l in (('a', a), ('b', b)):
+		assert cat[name].keys == l.keys
+		assert cat[name].val.tolist() == l.val.tolist()
+		assert cat[name].nll.tolist() == l.nll.tolist()
+	assert len(cat['empty']) == 0
+	# a later record of the same name replaces the earlier one
+	b.dump(path, 'a')
+	assert _Likelihood.load_binary(path, 'a').keys == b.keys
+
+def test_catalogue_float_keys(tmp_path):
+	# 0.1 as a float has a decimal expansion far too long for int64 keys
+	path = str(tmp_path / 'scans.ugfl')
+	l = _Likelihood()
+	for n in (0.1, 0.2, 0.3):
+		l[n] = n, -n
+	l.dump(path, 'f')
+	loaded = _Likelihood.load_binary(path, 'f')
+	assert loaded.keys == [0.1, 0.2, 0.3]
+	assert loaded.val.tolist() == [0.1, 0.2, 0.3]
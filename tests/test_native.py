@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from UGFlib.RooFit import batch, function, native
+from doubles import Real
+
+def test_fit_recovers_gaussian():
+	rng = np.random.default_rng(1)
+	sample = rng.normal(0.3, 0.8, 20000)
+	sample = sample[np.abs(sample) < 5]
+	mean, sigma = Real('mean', 0., -2., 2.), Real('sigma', 1., 0.1, 3.)
+	graph = batch.Shape(function.gaussian, [mean, sigma], Real('x', 0., -5., 5.))
+	res = native.fit(graph, sample)
+	assert res.status() == 0
+	assert mean.val == pytest.approx(sample.mean(), abs=1e-3)
+	assert sigma.val == pytest.approx(sample.std(), abs=1e-3)
+	assert mean.error == pytest.approx(sigma.val / len(sample) ** 0.5, rel=0.05)
+
+def test_constant_parameters_stay_put():
+	sample = np.random.default_rng(2).normal(0., 1., 1000)
+	mean, sigma = Real('mean', 0.5, -2., 2., constant=True), Real('sigma', 1.5, 0.1, 3.)
+	native.fit(batch.Shape(function.gaussian, [mean, sigma], Real('x', 0., -5., 5.)), sample)
+	assert mean.val == 0.5 and sigma.val != 1.5
+
+def test_formula_parameters_are_refused():
+	width = Real('width', 1., cls='RooFormulaVar')
+	with pytest.raises(NotImplementedError):
+		batch.Shape(function.gaussian, [Real('mean', 0.), width], Real('x', 0., -5., 5.))
@@ -0,0 +1,58 @@
+import pickle
+from UGFlib.RooFit.helper import FitDataPolicy
+from doubles import Real
+
+class Shape(object):
+	# a pdf wrapper as _resolution sees it: named slots and their Vars
+	def __init__(self, **slots):
+		self.args_default = list(slots)
+		self.l = list(slots.values())
+
+class Sum(object):
+	def __init__(self, *pdfs):
+		self.pair = [(Real('n', 1.), pdf) for pdf in pdfs]
+
+class Data(object):
+	def __init__(self, n, cls='RooDataSet'):
+		self.n = n
+		self.cls = cls
+	def InheritsFrom(self, cls):
+		return cls == self.cls
+	def sumEntries(self):
+		return self.n
+
+class Policy(FitDataPolicy):
+	# binning without ROOT: a conversion is just a record of what was converted
+	def convert(self, model, data, X=None):
+		return 'binned', id(data)
+
+X = Real('x', 0., 5.2, 5.3)
+
+def test_binning_follows_narrowest_resolution():
+	model = Sum(Shape(mean=Real('m', 5.28), sigma=Real('s1', 0.003)), Shape(mean=Real('m', 5.28), sigma1=Real('s2', 0.002), sigma2=Real('s3', 0.01)))
+	assert FitDataPolicy().binning(model, X) == 200
+	assert FitDataPolicy(per_sigma=1.).binning(model, X) == 100
+	assert FitDataPolicy(per_sigma=100.).binning(model, X) == 2000
+	assert FitDataPolicy(bins=64).binning(model, X) == 64
+	assert FitDataPolicy().binning(Sum(Shape(m0=Real('m0', 5.29))), X) == 2000
+
+def test_prepare_converts_large_datasets_once():
+	policy = Policy(threshold=1000, keep=2)
+	model = object()
+	small, large = Data(10), Data(10 ** 6)
+	assert policy.prepare(model, small) is small
+	assert policy.prepare(model, small, force=True) == ('binned', id(small))
+	hist = Data(10 ** 6, 'RooDataHist')
+	assert policy.prepare(model, hist) is hist
+	assert policy.prepare(model, large) == ('binned', id(large))
+	assert policy.prepare(model, large) is policy.prepare(model, large)
+
+def test_conversions_are_bounded_and_not_pickled():
+	policy = Policy(threshold=0, keep=2)
+	model = object()
+	data = [Data(10) for i in range(3)]
+	for d in data:
+		policy.prepare(model, d)
+	assert [key[0] for key in policy.converted] == [id(data[1]), id(data[2])]
+	copy = pickle.loads(pickle.dumps(policy))
+	assert len(copy.converted) == 0 and copy.keep == 2 and copy.threshold == 0
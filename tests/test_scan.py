@@ -0,0 +1,132 @@
+import decimal
+import math
+from UGFlib.RooFit import helper
+
+# A stand-in for the model, the dataset and the scanned yield: fitTo at N returns a result
+# whose minNll is a parabola in N, so the scan is a gaussian of known mean and width.
+
+class Yield(object):
+	def __init__(self):
+		self.val = 0.
+		self.constant = False
+	def getVal(self):
+		return self.val
+	def setVal(self, val):
+		self.val = float(val)
+	def setConstant(self, constant=True):
+		self.constant = constant
+
+class Result(object):
+	def __init__(self, nll):
+		self.nll = nll
+	def minNll(self):
+		return self.nll
+
+class Params(object):
+	def snapshot(self):
+		return None
+	def assignValueOnly(self, snapshot):
+		pass
+
+class Model(object):
+	def __init__(self, N, mean=8., sigma=3.):
+		self.N = N
+		self.mean = mean
+		self.sigma = sigma
+		self.fits = 0
+	def fitTo(self, data, *args):
+		self.fits += 1
+		return Result(100 + 0.5 * ((self.N.val - self.mean) / self.sigma) ** 2)
+	def getParameters(self, data):
+		return Params()
+
+def expected(n, mean=8., sigma=3.):
+	# the scan normalizes to N = 0
+	return math.exp(0.5 * (mean / sigma) ** 2 - 0.5 * ((n - mean) / sigma) ** 2)
+
+def scan(**kwargs):
+	N = Yield()
+	model = Model(N)
+	l = helper.likelihood(model, None, N, step=decimal.Decimal('0.5'), max=20, args=(), **kwargs)
+	return l, model, N
+
+def test_likelihood_normalized_to_zero():
+	l, model, N = scan()
+	assert model.fits == 40
+	for n, val, nll in l:
+		assert math.isclose(val, expected(float(n)), rel_tol=1e-9)
+	assert N.val == 0. and not N.constant
+
+def test_parallel_scan_matches_serial():
+	serial, model, N = scan()
+	printed, plotted = [], []
+	parallel, model, N = scan(workers=3, prnt=printed.append, extra_plot=plotted.append)
+	assert list(parallel) == list(serial)
+	# prnt and extra_plot run in the parent, in grid order
+	assert [line[0] for line in printed] == serial.keys
+	assert plotted == serial.keys
+
+def test_ignored_zero_normalizes_to_first_fitted_point():
+	for workers in (None, 2):
+		l, model, N = scan(ignore=(0,), workers=workers)
+		assert l[0] == (0, 0)
+		ref = expected(0.5)
+		for n, val, nll in list(l)[1:]:
+			assert math.isclose(val, expected(float(n)) / ref, rel_tol=1e-9)
+
+def adaptive(model_kwargs=None, **kwargs):
+	N = Yield()
+	model = Model(N, **(model_kwargs or {}))
+	l = helper.likelihood_adaptive(model, None, N, step=decimal.Decimal('0.1'), max=40, args=(), **kwargs)
+	return l, model
+
+def test_adaptive_scan_matches_full_scan():
+	N = Yield()
+	full = helper.likelihood(Model(N), None, N, step=decimal.Decimal('0.1'), max=40, args=())
+	l, model = adaptive()
+	assert model.fits < len(full) // 3
+	assert l.upper_limit().n == full.upper_limit().n
+	for n, val, nll in l:
+		assert math.isclose(val, full[n][0], rel_tol=1e-6)
+
+def test_adaptive_scan_stops_after_underflow():
+	# the likelihood underflows to 0 a few units above N = 0
+	l, model = adaptive({'mean': 0., 'sigma': 0.01}, coarse=4)
+	assert model.fits < 10
+
+def test_adaptive_scan_ignore_and_extra_plot():
+	plotted = []
+	ignore = (0, decimal.Decimal('1.5'))
+	l, model = adaptive(ignore=ignore, extra_plot=plotted.append)
+	assert not set(plotted) & set(ignore)
+	assert len(plotted) == model.fits
+	assert l[0] == (0, 0)
+	# normalized to N = 0.1, the first point not ignored
+	assert math.isclose(l[decimal.Decimal('0.1')][0], 1.)
+
+class Peak(Model):
+	# nll 0 with the yield floating, 0.5 * (mean / sigma) ** 2 with it fixed at 0
+	def fitTo(self, data, *args):
+		self.fits += 1
+		return Result(0.5 * (self.mean / self.sigma) ** 2 if self.N.constant else 0.)
+
+def test_significance_batch_reuses_fits():
+	N = Yield()
+	a, b = Peak(N, 6., 2.), Peak(N, 4., 2.)
+	jobs = [(a, None, N), (b, None, N), (a, None, N)]
+	ret = helper.significance_batch(jobs, args=())
+	assert [r.significance for r in ret] == [3., 2., 3.]
+	assert a.fits == 2 and b.fits == 2
+	assert ret[2].time_null == ret[0].time_null
+	parallel = helper.significance_batch(jobs, workers=2, args=())
+	assert [r.significance for r in parallel] == [3., 2., 3.]
+
+def test_significance_batch_known_nll():
+	N = Yield()
+	a = Peak(N, 6., 2.)
+	scan = helper._Likelihood()
+	scan[0] = 1., 0.
+	# a scanned nll0 of 0.0 and different known nll values are all used as given
+	ret = helper.significance_batch([(a, None, N, -2.), (a, None, N, -8.)], scans=[scan, scan], args=())
+	assert [r.significance for r in ret] == [2., 4.]
+	assert a.fits == 0
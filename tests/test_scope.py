@@ -0,0 +1,29 @@
+import gc
+from UGFlib.RooFit.scope import ModelScope, register
+
+class Obj(object):
+	pass
+
+def test_scope_releases_registry_entries():
+	named, listed = {}, []
+	keep = Obj()
+	named['outside'] = register('Var', keep, named)
+	with ModelScope('model') as scope:
+		named['a'] = register('Var', Obj(), named)
+		listed.append(register('DataSet', Obj(), listed))
+		inner = Obj()
+		named['b'] = register('Var', inner, named)
+		assert scope.live() == {'Var': 2, 'DataSet': 1}
+	assert list(named) == ['outside'] and listed == []
+	gc.collect()
+	# only what the caller still holds stays alive
+	assert scope.live() == {'Var': 1} and len(scope) == 1
+
+def test_scopes_nest():
+	named = {}
+	with ModelScope() as outer:
+		named['a'] = register('Var', Obj(), named)
+		with ModelScope() as inner:
+			named['b'] = register('Var', Obj(), named)
+		assert list(named) == ['a']
+	assert named == {}
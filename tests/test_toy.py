@@ -0,0 +1,95 @@
+import types
+import numpy as np
+import pytest
+from UGFlib.RooFit import toy
+from doubles import Real
+
+# ToyStudy against a model double: RooRandom's seed drives a NumPy generator from which the
+# model "generates" and "fits", so a toy's result depends on its seed only.
+
+class Random(object):
+	rng = None
+	def SetSeed(self, seed):
+		Random.rng = np.random.default_rng(seed)
+
+@pytest.fixture(autouse=True)
+def fake_root(monkeypatch):
+	random = Random()
+	monkeypatch.setattr(toy, 'root', types.SimpleNamespace(
+		RooArgSet=lambda *args: args,
+		RooFit=types.SimpleNamespace(Save=lambda: 'Save', Extended=lambda on=True: 'Extended', PrintLevel=lambda level: 'PrintLevel'),
+		RooRandom=types.SimpleNamespace(randomGenerator=lambda: random),
+		SetOwnership=lambda obj, own: None,
+		TObject=type('TObject', (object,), {})))
+
+class Data(object):
+	def __init__(self, n):
+		self.n = n
+	def sumEntries(self):
+		return self.n
+
+class Result(object):
+	def status(self):
+		return 0
+	def minNll(self):
+		return -1.
+
+class Snapshot(object):
+	def snapshot(self):
+		return None
+	def assignValueOnly(self, snapshot):
+		pass
+
+class Model(object):
+	def __init__(self, mu):
+		self.mu = mu
+		self.fits = 0
+		self.args = None
+	def getParameters(self, obs):
+		return Snapshot()
+	def generate(self, obs, *args):
+		return Data(float(Random.rng.poisson(100)))
+	def fitTo(self, data, *args):
+		self.fits += 1
+		self.args = args
+		self.mu.setVal(1. + Random.rng.normal(0., 0.1))
+		self.mu.setError(0.1)
+		return Result()
+
+def study(path=None, ntoys=20, **kwargs):
+	mu = Real('mu', 1.)
+	model = Model(mu)
+	return toy.ToyStudy(model, Real('x', 0.), [mu], ntoys, seed=7, path=path, **kwargs), model
+
+def test_results_do_not_depend_on_workers():
+	serial, model = study()
+	serial.run()
+	parallel, model = study()
+	parallel.run(workers=3)
+	assert np.array_equal(serial.results, parallel.results)
+	assert serial.results['done'].all()
+	assert len(set(serial.results['seed'].tolist())) == 20
+	assert serial.results['mu_pull'] == pytest.approx((serial.results['mu_val'] - 1.) / 0.1)
+
+def test_interrupted_study_resumes(tmp_path):
+	path = str(tmp_path / 'toys.npy')
+	full, model = study()
+	full.run()
+	first, model = study(path)
+	def stop(row):
+		if row[0] == 4:
+			raise KeyboardInterrupt
+	with pytest.raises(KeyboardInterrupt):
+		first.run(log=stop, flush=1)
+	resumed, model = study(path)
+	assert len(resumed.done) == 5
+	resumed.run()
+	assert model.fits == 15
+	assert np.array_equal(np.asarray(resumed.results), full.results)
+	with pytest.raises(ValueError):
+		study(path, ntoys=10)
+
+def test_fits_always_save_their_result():
+	custom, model = study(args=('Minos',))
+	custom.run_toy(0)
+	assert model.args == ('Minos', 'Save')